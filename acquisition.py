@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Acquisition worker that pulls, filters and buffers LSL data outside the GUI thread.
+"""
+import threading
+import logging
+import time
+import numpy as np
+from pylsl import cf_float32, cf_double64, cf_int8, cf_int16, cf_int32, cf_int64
+
+# Default cadence (Hz) at which the worker drains the inlets.
+DEFAULT_ACQUISITION_RATE = 200
+# Default number of samples that can be pulled in a single chunk.
+DEFAULT_MAX_SAMPLES = 1024
+
+# NumPy equivalents of the numeric LSL channel formats.
+CHANNEL_FORMAT_DTYPES = {cf_float32: np.float32, cf_double64: np.float64,
+                         cf_int8: np.int8, cf_int16: np.int16,
+                         cf_int32: np.int32, cf_int64: np.int64}
+
+class AcquisitionWorker(threading.Thread):
+    def __init__(self, target, acquisition_rate=DEFAULT_ACQUISITION_RATE):
+        # target is any object with an acquire() method (a Plotter or a Session).
+        super(AcquisitionWorker, self).__init__(name="LSLAcquisition", daemon=True)
+        self.target = target
+        self.period = 1.0/max(1, acquisition_rate)
+        self.stopEvent = threading.Event()
+        # Exceptions raised by acquire(), and the last one, logged once per
+        # distinct message so a failing tick does not flood the log.
+        self.failures = 0
+        self.lastError = None
+
+    def run(self):
+        # Drain the inlets at a fixed cadence. The render timer only snapshots
+        # the buffer, so a slow redraw never delays pull_chunk().
+        next_tick = time.monotonic()
+        while not self.stopEvent.is_set():
+            try:
+                self.target.acquire()
+            except Exception as error:
+                # Keep acquiring: a bad chunk must not freeze the plot for good.
+                self.failures += 1
+                if repr(error) != self.lastError:
+                    self.lastError = repr(error)
+                    logging.exception("Acquisition failed (keeps running).")
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self.stopEvent.wait(delay)
+            else:
+                # Running late: do not try to catch up tick by tick.
+                next_tick = time.monotonic()
+
+    def stop(self, timeout=1.0):
+        self.stopEvent.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class ChunkReader:
+    def __init__(self, inlet, max_samples=DEFAULT_MAX_SAMPLES):
+        # Pulls chunks straight into a preallocated array through pylsl's
+        # dest_obj support, instead of building lists of lists. String streams
+        # fall back to the regular pull_chunk() path.
+        self.inlet = inlet
+        self.max_samples = int(max_samples)
+        info = inlet.info()
+        self.channel_count = info.channel_count()
+        self.dtype = CHANNEL_FORMAT_DTYPES.get(info.channel_format())
+        self.direct = self.dtype is not None
+        if self.direct:
+            # liblsl writes samples row by row (sample-major, C-contiguous).
+            self.samples = np.zeros((self.max_samples, self.channel_count), dtype=self.dtype)
+        self.timestamps = np.zeros(self.max_samples)
+        
+    def pull(self):
+        # Returns a (channels x samples) view and the matching timestamps, or
+        # (None, None) when nothing arrived. Both are views on reused arrays and
+        # are only valid until the next call.
+        if not self.direct:
+            chunk, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=self.max_samples)
+            if not timestamps:
+                return None, None
+            n = len(timestamps)
+            self.timestamps[:n] = timestamps
+            y = np.asarray(chunk, dtype=float).transpose()
+            y[np.logical_not(np.isfinite(y))] = 0.0
+            return y, self.timestamps[:n]
+        
+        _, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=self.max_samples,
+                                              dest_obj=self.samples)
+        if not timestamps:
+            return None, None
+        n = len(timestamps)
+        self.timestamps[:n] = timestamps
+        y = self.samples[:n]
+        if self.dtype in (np.float32, np.float64):
+            # Scrub NaN/Inf in place.
+            np.nan_to_num(y, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        return y.T, self.timestamps[:n]
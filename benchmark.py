@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Headless end-to-end benchmark of the plotter.
+
+Starts a synthetic LSL outlet (and optionally a marker outlet) on this machine,
+drives Plotter with the offscreen Qt platform and no dialogs, and reports
+sample-to-screen latency, backlog, per-tick CPU time and frame rate for the
+matplotlib and pyqtgraph wrappers.
+
+    python benchmark.py --channels 256 --srate 2000 --chunk 20 --duration 10
+
+With --startup it instead measures the time to first frame of a fresh process
+(imports, stream resolution, plotter creation and first drawn frame) against
+a budget.
+"""
+import time
+START = time.perf_counter()
+import os
+import sys
+import json
+import argparse
+import threading
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from pylsl import StreamInfo, StreamOutlet, resolve_byprop, local_clock
+from qtpy import QtCore, QtWidgets
+# numpy, pylsl and Qt are loaded by any startup: count them in.
+BASE_IMPORTS = time.perf_counter() - START
+
+LIBRARIES = {"matplotlib": 0, "pyqtgraph": 1}
+# Labels of the first synthetic channels, so every montage of --montage
+# finds its electrodes; further channels are Ch<n>.
+LABELS_1020 = ["Fp1", "Fp2", "F7", "F3", "Fz", "F4", "F8", "T7", "C3", "Cz", "C4", "T8",
+               "P7", "P3", "Pz", "P4", "P8", "O1", "O2", "A1", "A2"]
+# Levels of --detect for the synthetic signal (a 10 Hz sine of amplitude 1
+# plus noise), so that every check runs without firing.
+DETECTION = {"threshold": 3.0, "peak_to_peak": 4.0, "flat": 1e-3, "line_noise": 0.5}
+
+class SyntheticOutlet(threading.Thread):
+    def __init__(self, channels, srate, chunk, marker_rate, source_id, channel_format="float32"):
+        super(SyntheticOutlet, self).__init__(name="SyntheticOutlet", daemon=True)
+        self.channels = channels
+        self.srate = srate
+        self.chunk = chunk
+        self.marker_rate = marker_rate
+        self.source_id = source_id
+        self.channel_format = channel_format
+        info = StreamInfo("BenchmarkEEG", "EEG", channels, srate, channel_format, source_id)
+        desc = info.desc().append_child("channels")
+        for k in range(channels):
+            label = LABELS_1020[k] if k < len(LABELS_1020) else "Ch%d" % (k+1)
+            desc.append_child("channel").append_child_value("label", label)
+        self.outlet = StreamOutlet(info, chunk)
+        self.markerOutlet = None
+        if marker_rate > 0:
+            markerInfo = StreamInfo("BenchmarkMarkers", "Markers", 1, 0, "string", source_id + "-markers")
+            self.markerOutlet = StreamOutlet(markerInfo)
+        self.stopEvent = threading.Event()
+        self.pushed = 0
+
+    def run(self):
+        rng = np.random.default_rng(0)
+        phase = 2*np.pi*10.0/self.srate*np.arange(self.chunk)
+        period = self.chunk/self.srate
+        start = time.monotonic()
+        next_marker = start
+        k = 0
+        while not self.stopEvent.is_set():
+            data = np.sin(phase + 2*np.pi*10.0*k*period)[:, np.newaxis] + \
+                   0.1*rng.standard_normal((self.chunk, self.channels))
+            if self.channel_format == "int16":
+                # Scaled like the counts of an ADC.
+                self.outlet.push_chunk((1000*data).astype(np.int16))
+            else:
+                self.outlet.push_chunk(data.astype(np.float32 if self.channel_format == "float32" else np.float64))
+            self.pushed += self.chunk
+            now = time.monotonic()
+            if self.markerOutlet is not None and now >= next_marker:
+                self.markerOutlet.push_sample(["M%d" % k])
+                next_marker += 1.0/self.marker_rate
+            k += 1
+            # Pace on the absolute schedule so the rate does not drift.
+            delay = start + k*period - time.monotonic()
+            if delay > 0:
+                self.stopEvent.wait(delay)
+
+    def stop(self):
+        self.stopEvent.set()
+        self.join(1.0)
+
+def percentiles(values, points=(50, 90, 99)):
+    if len(values) == 0:
+        return {str(p): None for p in points}
+    return {str(p): float(np.percentile(values, p)) for p in points}
+
+def runBenchmark(library, args, sortedStreams):
+    from plotter import Plotter
+    windowParameters = {"stream_num": 0, "max_time_range": args.time_range,
+                        "init_time_range": args.time_range, "init_data_scale": 1,
+                        "channel_min": 1, "channel_max": args.display_channels,
+                        "sampling_rate": float(args.srate), "refresh_rate": args.refresh_rate,
+                        "frequency_filter": args.filter.split(), "common_average": False,
+                        "standardize": False, "zero_mean": True,
+                        "plot_library": LIBRARIES[library],
+                        "instrumentation": args.stages is not None,
+                        "acquisition_process": args.acquisition_process,
+                        "spectrum": args.spectrum,
+                        "montage": args.montage,
+                        "detection": DETECTION if args.detect else None,
+                        "history_pyramid": not args.no_pyramid,
+                        "sample_dtype": args.dtype}
+    checkedMarkers = list(range(len(sortedStreams["discrete"])))
+    p = Plotter(windowParameters, checkedMarkers, sortedStreams)
+
+    results = {"latency": [], "render_cpu": [], "acquire_cpu": [], "chunk": [], "backlog": []}
+    updateData = p.updateData
+    acquire = p.acquire
+
+    def timedUpdateData(now=None):
+        # The window is snapshotted at the start of the frame, so the newest
+        # sample on screen is the newest one buffered at that point.
+        shown = p.lastTimestamp
+        t0 = time.thread_time()
+        drawn = updateData(now)
+        if not drawn:
+            # Nothing changed since the last frame.
+            return drawn
+        results["render_cpu"].append(time.thread_time() - t0)
+        if shown is not None:
+            # Age of the newest sample on screen once the frame is done.
+            results["latency"].append(local_clock() - shown)
+        return drawn
+
+    def timedAcquire():
+        before = p.str_buffer.nsamples
+        t0 = time.thread_time()
+        acquire()
+        results["acquire_cpu"].append(time.thread_time() - t0)
+        if p.str_buffer.nsamples > before:
+            results["chunk"].append(p.str_buffer.nsamples - before)
+            results["backlog"].append(local_clock() - p.lastTimestamp)
+
+    p.updateData = timedUpdateData
+    p.acquire = timedAcquire
+
+    app = QtWidgets.QApplication.instance()
+    QtCore.QTimer.singleShot(int(1000*args.duration), app.quit)
+    t0 = time.monotonic()
+    app.exec_()
+    elapsed = time.monotonic() - t0
+    frameStats = p.frameStats()
+    ingested = p.str_buffer.nsamples
+    buffers = [p.str_buffer, p.rawBuffer] + ([level for levels in p.pyramid.levels for level in levels[1:]]
+                                            if p.pyramid is not None else [])
+    bufferBytes = sum(b.buffer.nbytes for b in buffers if b is not None)
+    p.stop()
+    p.getWindow().close()
+    if args.stages is not None:
+        root, ext = os.path.splitext(args.stages)
+        p.exportInstrumentation(root + "_" + library + (ext or ".json"))
+
+    expected = int(elapsed*args.srate)
+    frames = len(results["render_cpu"])
+    return {"library": library, "channels": args.channels, "srate": args.srate,
+            "chunk": args.chunk, "duration": elapsed, "frames": frames,
+            "fps": frames/elapsed, "frames_skipped": frameStats["skipped"],
+            "idle_ticks": frameStats["idle"],
+            "latency_ms": {k: (v*1e3 if v is not None else None) for k, v in percentiles(results["latency"]).items()},
+            "render_cpu_ms": {k: (v*1e3 if v is not None else None) for k, v in percentiles(results["render_cpu"]).items()},
+            "acquire_cpu_ms": {k: (v*1e3 if v is not None else None) for k, v in percentiles(results["acquire_cpu"]).items()},
+            "inlet_backlog_ms": {k: (v*1e3 if v is not None else None) for k, v in percentiles(results["backlog"]).items()},
+            "samples_per_pull": percentiles(results["chunk"]),
+            "samples_ingested": ingested, "samples_expected": expected,
+            "samples_missing": max(0, expected - ingested),
+            "buffer_dtype": str(p.str_buffer.buffer.dtype), "buffer_mb": bufferBytes/2**20}
+
+def runStartup(args, source_id):
+    # Run first, in a fresh process: the plotter modules must not be imported yet.
+    stages = {"base_imports": BASE_IMPORTS}
+    t0 = time.perf_counter()
+    import plotter
+    from stream_resolver import StreamResolver
+    stages["import"] = time.perf_counter() - t0
+
+    app = QtWidgets.QApplication.instance()
+    t0 = time.perf_counter()
+    # Same order as Start(): resolution and the scipy preload start together.
+    resolver = StreamResolver(interval=0.01)
+    threading.Thread(target=plotter.preloadScipy, daemon=True).start()
+    found = lambda: [s for s in resolver.sortedStreams["continuous"] if s.source_id() == source_id]
+    while not found() and time.perf_counter() - t0 < 10.0:
+        app.processEvents()
+        time.sleep(0.005)
+    stages["resolve"] = time.perf_counter() - t0
+    if not found():
+        resolver.stop()
+        return None
+    sortedStreams = {"continuous": found(), "discrete": []}
+    resolver.stop()
+
+    windowParameters = {"stream_num": 0, "max_time_range": args.time_range,
+                        "init_time_range": args.time_range, "init_data_scale": 1,
+                        "channel_min": 1, "channel_max": args.display_channels,
+                        "sampling_rate": float(args.srate), "refresh_rate": args.refresh_rate,
+                        "frequency_filter": args.filter.split(), "common_average": False,
+                        "standardize": False, "zero_mean": True,
+                        "plot_library": LIBRARIES[args.library if args.library != "both" else "pyqtgraph"]}
+    t0 = time.perf_counter()
+    p = plotter.Plotter(windowParameters, [], sortedStreams)
+    stages["plotter"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    updateData = p.updateData
+    firstFrame = []
+    def timedUpdateData(now=None):
+        drawn = updateData(now)
+        if drawn and not firstFrame:
+            firstFrame.append(time.perf_counter())
+            app.quit()
+        return drawn
+    p.updateData = timedUpdateData
+    QtCore.QTimer.singleShot(10000, app.quit)
+    app.exec_()
+    p.stop()
+    p.getWindow().close()
+    if not firstFrame:
+        return None
+    stages["first_frame"] = firstFrame[0] - t0
+    # The synthetic outlet setup is not part of the plotter's startup.
+    total = sum(stages.values())
+    return {"stages": stages, "total": total, "budget": args.budget,
+            "within_budget": total <= args.budget,
+            "modules": {m: m in sys.modules for m in ("scipy", "matplotlib", "pyqtgraph")}}
+
+def printStartup(report):
+    print("startup (time to first frame): %.3f s, budget %.3f s -> %s" % (
+            report["total"], report["budget"], "OK" if report["within_budget"] else "OVER BUDGET"))
+    for name, value in report["stages"].items():
+        print("  %-15s %.3f s" % (name, value))
+    print("  modules loaded  " + "  ".join("%s=%s" % item for item in report["modules"].items()))
+
+def printReport(report):
+    print("%s: %d ch @ %g Hz, %.1f s" % (report["library"], report["channels"], report["srate"], report["duration"]))
+    print("  frames          %d (%.1f fps, %d skipped, %d idle)" % (report["frames"], report["fps"],
+                                                                report["frames_skipped"], report["idle_ticks"]))
+    for key in ("latency_ms", "render_cpu_ms", "acquire_cpu_ms", "inlet_backlog_ms"):
+        values = report[key]
+        print("  %-15s " % key + "  ".join("p%s=%s" % (p, "-" if v is None else "%.2f" % v) for p, v in values.items()))
+    print("  samples         %d ingested / %d expected (%d missing)" % (
+            report["samples_ingested"], report["samples_expected"], report["samples_missing"]))
+    print("  buffers         %.1f MB (%s)" % (report["buffer_mb"], report["buffer_dtype"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=64)
+    parser.add_argument("--display-channels", type=int, default=32)
+    parser.add_argument("--srate", type=float, default=1000.0)
+    parser.add_argument("--chunk", type=int, default=10, help="samples per pushed chunk")
+    parser.add_argument("--marker-rate", type=float, default=1.0, help="markers per second (0 disables)")
+    parser.add_argument("--refresh-rate", type=int, default=30)
+    parser.add_argument("--time-range", type=int, default=5, help="plotted window in seconds")
+    parser.add_argument("--filter", default="1 2 40 45", help="frequency filter as in the dialog")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per library")
+    parser.add_argument("--library", choices=["matplotlib", "pyqtgraph", "both"], default="both")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--stages", help="enable per-stage instrumentation and export it to this "
+                        ".csv/.json path (the library name is appended)")
+    parser.add_argument("--acquisition-process", action="store_true",
+                        help="acquire and filter in a separate process")
+    parser.add_argument("--spectrum", choices=["psd", "spectrogram"],
+                        help="also estimate and draw the spectrum")
+    parser.add_argument("--montage", choices=["average", "linked_mastoids", "double_banana", "laplacian"],
+                        help="display derived channels (the first 21 synthetic channels carry 10-20 labels)")
+    parser.add_argument("--no-pyramid", action="store_true",
+                        help="read long windows at the full rate instead of from the min/max levels")
+    parser.add_argument("--detect", action="store_true",
+                        help="run every event detection check on the filtered chunks (stage 'detect')")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="precision of the buffered, filtered and displayed samples")
+    parser.add_argument("--format", choices=["float32", "double64", "int16"], default="float32",
+                        help="channel format of the synthetic stream")
+    parser.add_argument("--startup", action="store_true", help="measure the time to first frame instead")
+    parser.add_argument("--budget", type=float, default=2.5, help="time to first frame budget in seconds")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    source_id = "benchmark-%d" % os.getpid()
+    outlet = SyntheticOutlet(args.channels, args.srate, args.chunk, args.marker_rate, source_id, args.format)
+    outlet.start()
+
+    if args.startup:
+        report = runStartup(args, source_id)
+        outlet.stop()
+        if report is None:
+            print("Error: no frame was drawn.")
+            return 1
+        printStartup(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+        return 0 if report["within_budget"] else 2
+
+    sortedStreams = {"continuous": resolve_byprop("source_id", source_id, timeout=5.0), "discrete": []}
+    if args.marker_rate > 0:
+        sortedStreams["discrete"] = resolve_byprop("source_id", source_id + "-markers", timeout=5.0)
+    if len(sortedStreams["continuous"]) == 0:
+        print("Error: the synthetic stream could not be resolved.")
+        outlet.stop()
+        return 1
+
+    libraries = ["matplotlib", "pyqtgraph"] if args.library == "both" else [args.library]
+    reports = []
+    for library in libraries:
+        report = runBenchmark(library, args, sortedStreams)
+        printReport(report)
+        reports.append(report)
+    outlet.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
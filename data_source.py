@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Data sources feeding the plotter: live LSL inlets, or replay of a recording
+made by recorder.py (or of an XDF file) at 1x, Nx or maximum speed.
+
+A continuous source provides name(), nominal_srate(), channel_count(),
+channelLabels(), sampleDtype(), markerSources(), clock() and pull(); pull() has the same
+contract as ChunkReader.pull(). A marker source provides name() and
+pull_chunk(timeout), like a StreamInlet.
+
+    python data_source.py recording_dir --speed 4
+"""
+import os
+import json
+import numpy as np
+from pylsl import StreamInlet, local_clock
+from acquisition import ChunkReader, DEFAULT_MAX_SAMPLES
+from recorder import HEADER_FILE, MARKER_DTYPE
+
+class InletSource:
+    # A live LSL stream.
+    live = True
+
+    def __init__(self, streamInfo, max_buflen):
+        self.inlet = StreamInlet(streamInfo, max_buflen=int(max_buflen))
+        self.info = self.inlet.info()
+        # Room for about one second of data per pull, so one pull drains the inlet.
+        self.chunkReader = ChunkReader(self.inlet, max(DEFAULT_MAX_SAMPLES, int(self.info.nominal_srate())))
+
+    def name(self):
+        return self.info.name()
+
+    def nominal_srate(self):
+        return self.info.nominal_srate()
+
+    def channel_count(self):
+        return self.info.channel_count()
+
+    def channelLabels(self):
+        # Labels from the stream description; "" where there is none.
+        labels = []
+        ch = self.info.desc().child("channels").child("channel")
+        for k in range(self.info.channel_count()):
+            labels.append(ch.child_value("label"))
+            ch = ch.next_sibling()
+        return labels
+
+    def sampleDtype(self):
+        # dtype of the pulled samples: the stream's numeric channel format.
+        return self.chunkReader.dtype or np.float64
+
+    def markerSources(self):
+        return []
+
+    def clock(self):
+        return local_clock()
+
+    def pull(self):
+        return self.chunkReader.pull()
+
+
+class InletMarkerSource:
+    def __init__(self, streamInfo):
+        self.inlet = StreamInlet(streamInfo)
+        self.streamName = self.inlet.info().name()
+
+    def name(self):
+        return self.streamName
+
+    def pull_chunk(self, timeout=0.0):
+        return self.inlet.pull_chunk(timeout=timeout)
+
+
+class ReplaySource:
+    # Replays a recording against its own clock. speed is a factor of real
+    # time, or None to replay as fast as the pipeline consumes it. Timestamps
+    # keep their recorded values, so markers stay aligned with the data.
+    live = False
+
+    def __init__(self, path, speed=1.0, stream=None, max_samples=DEFAULT_MAX_SAMPLES):
+        if path.lower().endswith(".xdf"):
+            self.openXDF(path, stream)
+        else:
+            self.openRecording(path)
+        self.max_samples = max(int(max_samples), int(self.srate))
+        self.out = np.zeros((self.max_samples, self.nchannels), dtype=self.dtype)
+        self.timestamps = np.zeros(self.max_samples)
+        # First sample of each segment, to locate a sample index.
+        self.segmentStarts = np.cumsum([0] + [len(seg[0]) for seg in self.segments])
+        self.segmentFirst = np.array([seg[0][0] for seg in self.segments])
+        self.speed = speed
+        self.seek(self.startTime())
+
+    def openRecording(self, path):
+        # Segments are memory-mapped, so only the pages that are replayed or
+        # searched are read from disk.
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            header = json.load(f)
+        self.streamName = header.get("name") or os.path.basename(os.path.normpath(path))
+        self.srate = header["srate"]
+        self.labels = header.get("channel_labels", [])
+        self.markerNames = header["marker_streams"]
+        self.segments = []
+        for entry in header["segments"]:
+            if entry["rows"] == 0:
+                continue
+            name = os.path.join(path, "data_%05d_" % entry["index"])
+            self.segments.append((np.load(name + "timestamps.npy", mmap_mode="r")[:entry["rows"]],
+                                  np.load(name + "raw.npy", mmap_mode="r")[:entry["rows"]]))
+        if len(self.segments) == 0:
+            raise ValueError("The recording in %s holds no samples." % path)
+        self.nchannels = self.segments[0][1].shape[1]
+        self.dtype = self.segments[0][1].dtype
+        markers = [np.load(os.path.join(path, "markers_%05d.npy" % entry["index"]))[:entry["rows"]]
+                   for entry in header["marker_segments"] if entry["rows"] > 0]
+        self.markers = np.concatenate(markers) if markers else np.empty(0, dtype=MARKER_DTYPE)
+
+    def openXDF(self, path, stream=None):
+        # XDF has no index to map samples lazily: pyxdf reads the file into
+        # memory once. Replays the first (or the named) regularly sampled
+        # stream; streams with a nominal rate of 0 become marker sources.
+        try:
+            import pyxdf
+        except ImportError:
+            raise ImportError("pyxdf is needed to replay XDF files.")
+        streams, _ = pyxdf.load_xdf(path)
+        continuous = [s for s in streams if float(s["info"]["nominal_srate"][0]) > 0]
+        if stream is not None:
+            continuous = [s for s in continuous if s["info"]["name"][0] == stream]
+        if len(continuous) == 0:
+            raise ValueError("No continuous stream to replay in %s." % path)
+        data = continuous[0]
+        self.streamName = data["info"]["name"][0]
+        self.srate = float(data["info"]["nominal_srate"][0])
+        self.labels = []
+        try:
+            channels = data["info"]["desc"][0]["channels"][0]["channel"]
+            self.labels = [ch["label"][0] for ch in channels]
+        except (KeyError, IndexError, TypeError):
+            pass
+        values = np.asarray(data["time_series"])
+        if values.dtype.kind not in "fi":
+            values = values.astype(float)
+        self.segments = [(np.asarray(data["time_stamps"], dtype=float), values)]
+        self.nchannels = values.shape[1]
+        self.dtype = values.dtype
+        discrete = [s for s in streams if float(s["info"]["nominal_srate"][0]) == 0]
+        self.markerNames = [s["info"]["name"][0] for s in discrete]
+        markers = []
+        for k, s in enumerate(discrete):
+            events = np.empty(len(s["time_stamps"]), dtype=MARKER_DTYPE)
+            events["timestamp"] = s["time_stamps"]
+            events["source"] = k
+            markers.append(events)
+        self.markers = np.sort(np.concatenate(markers), order="timestamp") if markers \
+            else np.empty(0, dtype=MARKER_DTYPE)
+
+    def name(self):
+        return self.streamName
+
+    def nominal_srate(self):
+        return self.srate
+
+    def channel_count(self):
+        return self.nchannels
+
+    def channelLabels(self):
+        return list(self.labels) + [""]*(self.nchannels - len(self.labels))
+
+    def sampleDtype(self):
+        return self.dtype
+
+    def markerSources(self):
+        return [ReplayMarkerSource(self, k) for k in range(len(self.markerNames))]
+
+    def startTime(self):
+        return float(self.segments[0][0][0])
+
+    def endTime(self):
+        return float(self.segments[-1][0][-1])
+
+    def clock(self):
+        # Recording time currently shown.
+        if self.speed is None:
+            return self.position
+        # Playback stops at the end of the recording.
+        return min(self.clockStart + (local_clock() - self.wallStart)*self.speed, self.endTime())
+
+    def setSpeed(self, speed):
+        now = self.clock()
+        self.speed = speed
+        self.clockStart = now
+        self.wallStart = local_clock()
+        self.position = now
+
+    def indexOf(self, t):
+        # Index of the first sample at or after t. Only the timestamps of one
+        # segment are searched.
+        k = max(0, int(np.searchsorted(self.segmentFirst, t, side="right")) - 1)
+        return int(self.segmentStarts[k] + np.searchsorted(self.segments[k][0], t, side="left"))
+
+    def seek(self, t, preroll=0.0):
+        # Continue the replay at time t. The preroll seconds before t are
+        # delivered by the next pulls, so the plotted window fills at once.
+        t = min(max(t, self.startTime()), self.endTime())
+        self.index = self.indexOf(t - preroll)
+        # One cursor per marker source, into the sorted marker array.
+        self.markerCursors = [int(np.searchsorted(self.markers["timestamp"], t - preroll, side="left"))]*len(self.markerNames)
+        self.clockStart = t
+        self.wallStart = local_clock()
+        self.position = t
+
+    def pull(self):
+        first = self.index
+        last = min(first + self.max_samples, int(self.segmentStarts[-1]))
+        if self.speed is not None:
+            last = min(last, self.indexOf(np.nextafter(self.clock(), np.inf)))
+        if last <= first:
+            return None, None
+        # Copy the rows, which may span several segments, into the reused arrays.
+        pos = 0
+        k = int(np.searchsorted(self.segmentStarts, first, side="right")) - 1
+        while first + pos < last:
+            row = first + pos - int(self.segmentStarts[k])
+            n = min(last - first - pos, len(self.segments[k][0]) - row)
+            self.timestamps[pos:pos+n] = self.segments[k][0][row:row+n]
+            self.out[pos:pos+n] = self.segments[k][1][row:row+n]
+            pos += n
+            k += 1
+        self.index = last
+        if self.speed is None:
+            self.position = self.timestamps[pos-1]
+        return self.out[:pos].T, self.timestamps[:pos]
+
+    def pullMarkers(self, source):
+        # Timestamps of the events of source replayed since the last call.
+        # Events of other sources are kept until those sources pull them.
+        last = int(np.searchsorted(self.markers["timestamp"], self.clock(), side="right"))
+        events = self.markers[self.markerCursors[source]:last]
+        self.markerCursors[source] = max(last, self.markerCursors[source])
+        return events["timestamp"][events["source"] == source]
+
+
+class ReplayMarkerSource:
+    def __init__(self, replay, source):
+        self.replay = replay
+        self.source = source
+
+    def name(self):
+        return self.replay.markerNames[self.source]
+
+    def pull_chunk(self, timeout=0.0):
+        timestamps = self.replay.pullMarkers(self.source).tolist()
+        return [[self.name()]]*len(timestamps), timestamps
+
+
+def main(argv=None):
+    import sys
+    import argparse
+    from qtpy import QtWidgets
+    from plotter import Plotter
+    from montage import BUILDERS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="recording directory or .xdf file")
+    parser.add_argument("--speed", default="1", help="replay speed factor, or 'max'")
+    parser.add_argument("--start", type=float, help="seconds from the start of the recording")
+    parser.add_argument("--stream", help="stream to replay from an XDF file")
+    parser.add_argument("--channels", default="1-32", help="displayed channel range")
+    parser.add_argument("--time-range", type=int, default=5, help="plotted window in seconds")
+    parser.add_argument("--filter", default="0", help="frequency filter as in the dialog")
+    parser.add_argument("--spectrum", choices=["psd", "spectrogram"], help="also show a spectral view")
+    parser.add_argument("--montage", choices=sorted(BUILDERS), help="display derived channels")
+    parser.add_argument("--refresh-rate", type=int, default=30)
+    parser.add_argument("--library", choices=["matplotlib", "pyqtgraph"], default="pyqtgraph")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    source = ReplaySource(args.path, None if args.speed == "max" else float(args.speed), args.stream)
+    channel_min, channel_max = [int(c) for c in args.channels.split("-")]
+    windowParameters = {"stream_num": 0, "max_time_range": args.time_range,
+                        "init_time_range": args.time_range, "init_data_scale": 1,
+                        "channel_min": channel_min, "channel_max": channel_max,
+                        "sampling_rate": source.nominal_srate(), "refresh_rate": args.refresh_rate,
+                        "frequency_filter": args.filter.split(), "common_average": False,
+                        "standardize": False, "zero_mean": True,
+                        "plot_library": 0 if args.library == "matplotlib" else 1,
+                        "spectrum": args.spectrum, "montage": args.montage}
+    p = Plotter(windowParameters, list(range(len(source.markerNames))), None, source=source)
+    if args.start is not None:
+        p.seek(source.startTime() + args.start)
+    app.exec_()
+    p.stop()
+    return 0
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Peak-preserving (min/max) decimation of the plotted window.
+"""
+import numpy as np
+
+def minMaxDecimate(timeData, yData, ncolumns):
+    # Reduce a (channels x samples) window to one min/max pair per column.
+    # The pairs are interleaved (min, max, min, max, ...) so a single line per
+    # channel draws the envelope as vertical strokes and spikes stay visible.
+    # Column widths differ by at most one sample, so no sample is dropped.
+    npoints = np.shape(yData)[1]
+    ncolumns = int(ncolumns)
+    if ncolumns <= 0 or npoints <= 2*ncolumns:
+        return timeData, yData
+
+    bounds = (np.arange(ncolumns + 1)*npoints)//ncolumns
+    starts = bounds[:-1]
+
+    envelope = np.empty((np.shape(yData)[0], 2*ncolumns), dtype=yData.dtype)
+    envelope[:, 0::2] = np.minimum.reduceat(yData, starts, axis=1)
+    envelope[:, 1::2] = np.maximum.reduceat(yData, starts, axis=1)
+
+    envelopeTime = np.empty(2*ncolumns, dtype=np.result_type(timeData, np.float64))
+    envelopeTime[0::2] = timeData[starts]
+    envelopeTime[1::2] = timeData[bounds[1:] - 1]
+    return envelopeTime, envelope
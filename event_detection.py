@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Online detection of amplitude artifacts, flat (disconnected) channels and
+line noise in the filtered chunks, for all channels at once.
+
+Every check compares a measure of each channel with an onset level and a
+release level (hysteresis). The state of every channel is carried from chunk
+to chunk, so a channel that stays beyond the level yields a single event. The
+amplitude threshold is checked on every sample. Peak-to-peak amplitude,
+flatness and the share of power at the line frequency are checked on blocks
+of samples aligned to the sample count.
+"""
+import time
+import numpy as np
+
+# Checks, in the order of their marker sources.
+KINDS = ("threshold", "peak_to_peak", "flat", "line_noise")
+# Seconds per block of the block checks.
+DEFAULT_BLOCK = 0.2
+# A check is released at this fraction of its level (flat: at its level
+# divided by it).
+DEFAULT_HYSTERESIS = 0.8
+DEFAULT_LINE_FREQUENCY = 50.0
+# Seconds of detection per chunk; when a chunk takes longer, the line noise
+# check is skipped in the next one.
+DEFAULT_BUDGET = 0.002
+
+def hysteresis(on, off, state):
+    # State of every channel (rows) after every column: set where on, cleared
+    # where off (on wins), held otherwise. state is the state before the first
+    # column. Returns the states and the onsets, where a state becomes set.
+    columns = np.arange(np.shape(on)[1])
+    marks = np.where(on | off, columns, -1)
+    last = np.maximum.accumulate(marks, axis=1)
+    states = np.where(last >= 0, np.take_along_axis(on, np.maximum(last, 0), axis=1), state[:, np.newaxis])
+    previous = np.concatenate((state[:, np.newaxis], states[:, :-1]), axis=1)
+    return states, states & ~previous
+
+class EventDetector:
+    def __init__(self, nchannels, srate, threshold=None, peak_to_peak=None, flat=None, line_noise=None,
+                 line_frequency=DEFAULT_LINE_FREQUENCY, block=DEFAULT_BLOCK, hysteresis=DEFAULT_HYSTERESIS,
+                 budget=DEFAULT_BUDGET, dtype=np.float64):
+        # A level of None disables its check. threshold (absolute amplitude),
+        # peak_to_peak and flat (the peak-to-peak amplitude below which a
+        # channel is flat) are in signal units; line_noise is the share (0 to
+        # 1) of the power of a block at line_frequency.
+        self.nchannels = nchannels
+        self.levels = dict(zip(KINDS, (threshold, peak_to_peak, flat, line_noise)))
+        if line_noise is not None and not 0 < line_frequency < srate/2:
+            print("Warning. The line frequency is not below the Nyquist frequency: no line noise detection.")
+            self.levels["line_noise"] = None
+        self.hysteresis = hysteresis
+        self.budget = budget
+        self.block = max(2, int(round(block*srate))) if srate > 0 else 64
+        # Cosine and sine at the line frequency, for the power of every block
+        # in one product.
+        t = np.arange(self.block)/srate if srate > 0 else np.zeros(self.block)
+        self.carrier = np.stack((np.cos(2*np.pi*line_frequency*t), np.sin(2*np.pi*line_frequency*t)), axis=1).astype(dtype)
+        self.blockChecks = any(self.levels[kind] is not None for kind in KINDS[1:])
+        # Samples of the block in progress and their timestamps.
+        self.pending = np.empty((nchannels, self.block), dtype=dtype)
+        self.pendingTimes = np.empty(self.block)
+        self.fill = 0
+        self.states = {kind: np.zeros(nchannels, dtype=bool) for kind in KINDS}
+        # Time the last chunk took, and line noise checks skipped over budget.
+        self.elapsed = 0.0
+        self.skipped = 0
+
+    def process(self, y, timestamps):
+        # Check a (channels x samples) chunk. Returns its events as (index of
+        # the check in KINDS, timestamp, rows of the channels) tuples: per
+        # sample for the threshold, per block (at its first sample) otherwise.
+        t0 = time.perf_counter()
+        events = []
+        level = self.levels["threshold"]
+        if level is not None:
+            amplitude = np.abs(y)
+            on = amplitude > level
+            # Nothing can change while every channel is below the level.
+            if on.any() or self.states["threshold"].any():
+                self.check(0, on, amplitude < level*self.hysteresis, timestamps, events)
+        if self.blockChecks:
+            blocks, times = self.blocks(y, timestamps)
+            if blocks is not None:
+                self.checkBlocks(blocks, times, events)
+        self.elapsed = time.perf_counter() - t0
+        return events
+
+    def blocks(self, y, timestamps):
+        # The blocks completed by the chunk (channels x blocks x samples) and
+        # the timestamps of their first samples, or None.
+        n = np.shape(y)[1]
+        total = self.fill + n
+        nblocks = total//self.block
+        if nblocks == 0:
+            self.pending[:, self.fill:total] = y
+            self.pendingTimes[self.fill:total] = timestamps
+            self.fill = total
+            return None, None
+        data = np.concatenate((self.pending[:, :self.fill], y), axis=1)
+        times = np.concatenate((self.pendingTimes[:self.fill], timestamps))
+        used = nblocks*self.block
+        self.fill = total - used
+        self.pending[:, :self.fill] = data[:, used:]
+        self.pendingTimes[:self.fill] = times[used:]
+        return data[:, :used].reshape(self.nchannels, nblocks, self.block), times[:used:self.block]
+
+    def checkBlocks(self, blocks, times, events):
+        h = self.hysteresis
+        ptp = np.ptp(blocks, axis=2)
+        level = self.levels["peak_to_peak"]
+        if level is not None:
+            self.check(1, ptp > level, ptp < level*h, times, events)
+        level = self.levels["flat"]
+        if level is not None:
+            self.check(2, ptp < level, ptp > level/h, times, events)
+        level = self.levels["line_noise"]
+        if level is not None and self.elapsed > self.budget:
+            # The previous chunk ran over budget: shed the costliest check.
+            self.skipped += 1
+        elif level is not None:
+            x = blocks - np.mean(blocks, axis=2, keepdims=True)
+            power = np.sum((x @ self.carrier)**2, axis=2)
+            # A sinusoid at the line frequency alone has a share of 1.
+            share = 2*power/(self.block*np.maximum(np.sum(x*x, axis=2), 1e-30))
+            self.check(3, share > level, share < level*h, times, events)
+
+    def check(self, kind, on, off, times, events):
+        states, onsets = hysteresis(on, off, self.states[KINDS[kind]])
+        self.states[KINDS[kind]] = states[:, -1]
+        for column in np.flatnonzero(onsets.any(axis=0)):
+            events.append((kind, float(times[column]), np.flatnonzero(onsets[:, column])))
+
+    def reset(self):
+        self.fill = 0
+        for state in self.states.values():
+            state[:] = False
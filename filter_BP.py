@@ -3,16 +3,34 @@
 @author: Antonio
 """
 import numpy as np
-from scipy import special, interpolate
+from filter_cache import defaultCache
+
+# scipy is imported by the design methods only, as it takes longer to import
+# than the rest of the plotter and cached kernels do not need it.
 
 class BandPassFilter:
-    def __init__(self, freqFilterParams, srate):
+    def __init__(self, freqFilterParams, srate, iir=False, cache=None):
+        # Designed kernels are memoized in cache (the shared default cache if None).
         self.B = []
-        if(len(freqFilterParams) is 4):
+        self.sos = None
+        self.sosZi = None
+        if cache is None:
+            cache = defaultCache()
+        freqs = tuple(float(freq) for freq in freqFilterParams)
+        if(len(freqFilterParams) == 4 and iir):
+            # Design second-order sections IIR filter with the same pass band
+            self.sos = cache.get(("iir", freqs, float(srate), 20),
+                                 lambda: self.designIIR(list(freqs), srate, 20))
+            self.sosZi = cache.get(("iir_zi", freqs, float(srate), 20),
+                                   lambda: self.designSOSZi(self.sos))
+            self.B = np.asarray([])
+            
+        elif(len(freqFilterParams) == 4):
             # Design moving-average (low-pass) filter
-            self.B = self.designBPF(freqFilterParams, srate, 20, True)
+            self.B = cache.get(("fir", freqs, float(srate), 20, True),
+                               lambda: self.designBPF(list(freqs), srate, 20, True))
             
-        elif(len(freqFilterParams) is 1):
+        elif(len(freqFilterParams) == 1):
             # Design band-pass filter
             self.B = np.asarray([1]*freqFilterParams[0])/max(1,freqFilterParams[0])
             self.B = np.transpose(self.B)
@@ -45,7 +63,22 @@ class BandPassFilter:
             
         return B
         
+    def designIIR(self,freqs,srate,atten):
+        # freqs are the band edges [stop low, pass low, pass high, stop high] in Hz.
+        from scipy import signal
+        nyquist = srate/2
+        f = [min(freq, 0.95*nyquist) for freq in freqs]
+        if f[0] <= 0 or f[1] <= 0:
+            # No lower stop band: design a low-pass filter.
+            return signal.iirdesign(f[2], f[3], 3, atten, ftype='butter', output='sos', fs=srate)
+        return signal.iirdesign([f[1], f[2]], [f[0], f[3]], 3, atten, ftype='butter', output='sos', fs=srate)
+    
+    def designSOSZi(self,sos):
+        from scipy import signal
+        return signal.sosfilt_zi(sos)
+        
     def designFIR(self,N,F,A,W):
+        from scipy import interpolate
         nfft = max(512,np.power(2,np.ceil(np.log(N)/np.log(2))))
         #odd = False
         
@@ -65,6 +98,7 @@ class BandPassFilter:
         return B
         
     def designKaiser(self,lo,hi,atten,odd):
+        from scipy import special
         # design a Kaiser window for a low-pass FIR filter
         # determine beta parameter of the window
         if atten < 21:
@@ -85,4 +119,10 @@ class BandPassFilter:
         return W
         
     def returnFilter(self):
-        return self.B
\ No newline at end of file
+        return self.B
+    
+    def returnSOS(self):
+        return self.sos
+    
+    def returnSOSZi(self):
+        return self.sosZi
\ No newline at end of file
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Memoizing cache for designed filter kernels: in-process LRU plus an on-disk
+store of .npy files with size-bounded eviction.
+"""
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get("LSL_PLOTTER_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "lsl_plotter", "filters"))
+DEFAULT_MEMORY_ENTRIES = 32
+DEFAULT_DISK_BYTES = 50*1024*1024
+# Part of every on-disk key: bump it whenever the filter design code changes,
+# so coefficients designed by older code are not loaded.
+DESIGN_VERSION = 1
+
+class FilterCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_bytes=DEFAULT_DISK_BYTES):
+        # cache_dir=None keeps the cache in memory only.
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+
+    def get(self, key, design):
+        # Return the array cached under key, calling design() on a miss.
+        # key is a tuple such as ("fir", band edges, srate, atten, minphase).
+        key = tuple(key)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        value = self.load(key)
+        if value is None:
+            value = np.asarray(design())
+            self.store(key, value)
+        self.remember(key, value)
+        return value
+
+    def remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def path(self, key):
+        digest = hashlib.sha1(repr((DESIGN_VERSION,) + key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".npy")
+
+    def load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self.path(key)
+        try:
+            value = np.load(path, allow_pickle=False)
+            # Touch the file so eviction drops the least recently used ones.
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, value):
+        if self.cache_dir is None:
+            return
+        path = self.path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file first so readers never see partial files.
+            tmp_path = path + ".%d.tmp" % os.getpid()
+            with open(tmp_path, "wb") as f:
+                np.save(f, value, allow_pickle=False)
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError as e:
+            print("Warning. Filter cache could not be written: " + str(e))
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(entry[1] for entry in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        self.memory.clear()
+        if self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+_defaultCache = None
+
+def defaultCache():
+    # Cache shared by every filter designed in this process.
+    global _defaultCache
+    if _defaultCache is None:
+        _defaultCache = FilterCache()
+    return _defaultCache
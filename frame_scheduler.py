@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Render scheduler that stretches the frame interval under load and coalesces
+missed ticks instead of queueing them.
+"""
+import time
+from collections import deque
+from qtpy import QtCore
+
+# Fraction of the GUI thread that rendering may take before the frame
+# interval is stretched.
+MAX_RENDER_LOAD = 0.7
+# Smoothing factor of the frame cost estimate.
+COST_ALPHA = 0.2
+
+class FrameScheduler:
+    def __init__(self, callback, refresh_rate=30):
+        # callback() renders a frame and returns True if anything was drawn.
+        self.callback = callback
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.setRate(refresh_rate)
+        self.frameCost = 0.0
+        self.lastTick = None
+        self.frames = 0
+        self.skipped = 0
+        self.idle = 0
+        self.frameTimes = deque(maxlen=256)
+
+    def setRate(self, refresh_rate):
+        self.period = 1.0/max(1, refresh_rate)
+        self.interval = self.period
+
+    def start(self):
+        if not self.timer.isActive():
+            self.lastTick = None
+            self.timer.start(0)
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        t0 = time.monotonic()
+        if self.lastTick is not None:
+            # Ticks of the requested rate that passed since the previous one
+            # are dropped, not replayed.
+            self.skipped += max(0, int((t0 - self.lastTick)/self.period + 0.5) - 1)
+        self.lastTick = t0
+        drawn = self.callback()
+        t1 = time.monotonic()
+        if drawn:
+            self.frames += 1
+            self.frameTimes.append(t1)
+            self.frameCost += COST_ALPHA*((t1 - t0) - self.frameCost)
+        else:
+            self.idle += 1
+        # Lower the frame rate when rendering would starve the event loop.
+        self.interval = max(self.period, self.frameCost/MAX_RENDER_LOAD)
+        # The next tick is timed from the start of this one, never queued.
+        delay = max(0.0, t0 + self.interval - time.monotonic())
+        self.timer.start(int(delay*1000))
+
+    def frameRate(self):
+        # Frames actually drawn per second over the last two seconds.
+        now = time.monotonic()
+        times = [t for t in self.frameTimes if t > now - 2.0]
+        if len(times) < 2:
+            return 0.0
+        return (len(times) - 1)/(times[-1] - times[0])
+
+    def stats(self):
+        return {"fps": self.frameRate(), "frames": self.frames,
+                "skipped": self.skipped, "idle": self.idle,
+                "interval": self.interval}
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Low-overhead timing of the acquisition and render stages, kept in fixed-size
+histograms, with CSV/JSON export.
+"""
+import csv
+import json
+import time
+import numpy as np
+
+# Log-spaced bins from 1 us to 10 s for durations.
+DURATION_EDGES = np.logspace(-6, 1, 71)
+# Linear bins for pulled/expected sample ratios.
+RATIO_EDGES = np.linspace(0.0, 4.0, 81)
+
+class Histogram:
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = np.zeros(len(edges)+1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, value):
+        # Values below/above the edges go to the first/last bin.
+        self.counts[np.searchsorted(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        # Upper edge of the bin holding the q-th percentile.
+        if self.count == 0:
+            return 0.0
+        pos = int(np.searchsorted(np.cumsum(self.counts), q/100.0*self.count))
+        return float(self.edges[min(pos, len(self.edges)-1)])
+
+    def summary(self):
+        return {"count": self.count,
+                "mean": self.total/self.count if self.count else 0.0,
+                "p50": self.percentile(50), "p90": self.percentile(90),
+                "p99": self.percentile(99), "max": self.max, "last": self.last}
+
+class Instrumentation:
+    def __init__(self):
+        self.stages = {}
+        self.values = {}
+
+    def clock(self):
+        return time.perf_counter()
+
+    def record(self, stage, t0):
+        # Record the time elapsed since t0 = clock() under stage.
+        elapsed = time.perf_counter() - t0
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram(DURATION_EDGES)
+        histogram.add(elapsed)
+
+    def recordValue(self, name, value, edges=RATIO_EDGES):
+        histogram = self.values.get(name)
+        if histogram is None:
+            histogram = self.values[name] = Histogram(edges)
+        histogram.add(value)
+
+    def summary(self):
+        stages = {name: h.summary() for name, h in list(self.stages.items())}
+        values = {name: h.summary() for name, h in list(self.values.items())}
+        return {"stages": stages, "values": values}
+
+    def overlayText(self):
+        lines = []
+        for name, h in sorted(list(self.stages.items())):
+            s = h.summary()
+            lines.append("%-10s %7.2f ms  p90 %7.2f  max %7.2f" % (name, s["last"]*1e3, s["p90"]*1e3, s["max"]*1e3))
+        for name, h in sorted(list(self.values.items())):
+            s = h.summary()
+            lines.append("%-10s %7.2f     p90 %7.2f  max %7.2f" % (name, s["last"], s["p90"], s["max"]))
+        return "\n".join(lines)
+
+    def exportJSON(self, path):
+        data = self.summary()
+        data["histograms"] = {name: {"edges": h.edges.tolist(), "counts": h.counts.tolist()}
+                              for name, h in list(self.stages.items()) + list(self.values.items())}
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def exportCSV(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "unit", "count", "mean", "p50", "p90", "p99", "max"])
+            for unit, group in (("s", self.stages), ("", self.values)):
+                for name, h in sorted(list(group.items())):
+                    s = h.summary()
+                    writer.writerow([name, unit, s["count"], s["mean"], s["p50"], s["p90"], s["p99"], s["max"]])
+
+class NullInstrumentation:
+    # Drop-in replacement used when instrumentation is off: every call is a
+    # no-op, so the hot path only pays for an empty method call.
+    def clock(self):
+        return 0.0
+
+    def record(self, stage, t0):
+        pass
+
+    def recordValue(self, name, value, edges=None):
+        pass
+
+NULL_INSTRUMENTATION = NullInstrumentation()
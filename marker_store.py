@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Time-sorted, array-backed store of marker events.
+"""
+import numpy as np
+
+class MarkerStore:
+    def __init__(self, capacity=256):
+        # Live markers are ts[start:end], sorted by timestamp. source is the
+        # index of the marker stream each event came from.
+        self.ts = np.empty(capacity)
+        self.source = np.empty(capacity, dtype=np.int32)
+        self.start = 0
+        self.end = 0
+        # Bumped on every change, so readers can tell when to redraw.
+        self.version = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def add(self, timestamps, source):
+        # Append the events of one pulled chunk of marker stream source.
+        timestamps = np.asarray(timestamps, dtype=float)
+        n = np.size(timestamps)
+        if n == 0:
+            return
+        if self.end + n > np.size(self.ts):
+            self.reserve(n)
+        first = self.end
+        self.ts[first:first+n] = timestamps
+        self.source[first:first+n] = source
+        self.end += n
+        # Chunks from different streams can interleave in time; re-sort only
+        # the live range, and only when the new events broke the order.
+        lo = max(first-1, self.start)
+        if np.any(np.diff(self.ts[lo:self.end]) < 0):
+            order = np.argsort(self.ts[self.start:self.end], kind='stable')
+            self.ts[self.start:self.end] = self.ts[self.start:self.end][order]
+            self.source[self.start:self.end] = self.source[self.start:self.end][order]
+        self.version += 1
+
+    def reserve(self, n):
+        # Drop evicted entries from the front and grow if still too small.
+        live = self.end - self.start
+        capacity = np.size(self.ts)
+        # Keep at least half of the capacity free after compacting, so the
+        # copy is amortized over many additions.
+        while live + n > capacity // 2:
+            capacity *= 2
+        if capacity != np.size(self.ts):
+            ts = np.empty(capacity)
+            source = np.empty(capacity, dtype=np.int32)
+        else:
+            ts = self.ts
+            source = self.source
+        ts[:live] = self.ts[self.start:self.end]
+        source[:live] = self.source[self.start:self.end]
+        self.ts = ts
+        self.source = source
+        self.start = 0
+        self.end = live
+
+    def evictBefore(self, t):
+        # Forget events older than t (binary search, no copying).
+        count = int(np.searchsorted(self.ts[self.start:self.end], t, side='left'))
+        if count > 0:
+            self.start += count
+            self.version += 1
+
+    def window(self, tmin, tmax):
+        # Copies of the timestamps and sources of the events in [tmin, tmax].
+        live = self.ts[self.start:self.end]
+        i0 = int(np.searchsorted(live, tmin, side='left'))
+        i1 = int(np.searchsorted(live, tmax, side='right'))
+        return live[i0:i1].copy(), self.source[self.start+i0:self.start+i1].copy()
@@ -12,7 +12,11 @@ class DialogMarkers(QtWidgets.QDialog, Ui_MainWindow):
         super(DialogMarkers, self).__init__()
         Ui_MainWindow.__init__(self)
         self.setupUi(self)
-        for stream in listStreams:
+        self.setStreams(listStreams)
+    
+    def setStreams(self, listStreams):
+        # Streams are only ever appended, so the check states are kept.
+        for stream in listStreams[self.listStreams.count():]:
             chkBoxItem = QtWidgets.QListWidgetItem()
             chkBoxItem.setFlags(QtCore.Qt.ItemIsUserCheckable | QtCore.Qt.ItemIsEnabled)
             chkBoxItem.setCheckState(QtCore.Qt.Unchecked)
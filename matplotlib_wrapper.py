@@ -2,7 +2,9 @@ import numpy as np
 
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
 from qtpy import QtWidgets
+from instrumentation import NULL_INSTRUMENTATION
 
 class PlotWrapper(QtWidgets.QWidget):
     def __init__(self, plotParams, parent=None):     
@@ -14,10 +16,23 @@ class PlotWrapper(QtWidgets.QWidget):
         layout.addWidget(self.canvas)
         self.setLayout(layout)
         self.ax = self.figure.add_subplot(111)
+        # In blit mode the data, marker and overlay artists are animated: a full
+        # draw only renders the static axes, which are cached as the background
+        # and restored each frame before redrawing the animated artists.
+        self.blit = plotParams.get("blit", True)
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.onDraw)
         self.curves = []
-        self.markerList = []
         self.tableColorList = ['r', 'g', 'y', 'c', 'm', 'b']
+        # All markers are drawn by one line collection; labels come from a
+        # small pool of text artists.
+        self.maxLabels = plotParams.get("max_marker_labels", 64)
+        self.markerLines = LineCollection([], linewidths=1.0, zorder=3, animated=self.blit)
+        self.ax.add_collection(self.markerLines)
+        self.markerLabels = []
         self.maxTimeRange = plotParams["max_time_range"]
+        self.instrumentation = plotParams.get("instrumentation", NULL_INSTRUMENTATION)
+        self.overlay = None
         
         tick_pos = []
         tick_name = []
@@ -30,7 +45,7 @@ class PlotWrapper(QtWidgets.QWidget):
                yticklabels = tick_name);
         self.ax.set_title(plotParams["name"], y = 1.04)
         for ch_ix in range(plotParams["chann_num"]):
-            line, = self.ax.plot([],[])
+            line, = self.ax.plot([],[], animated=self.blit)
             self.curves.append(line)
         self.canvas.draw()
         self.canvas.flush_events()
@@ -39,44 +54,110 @@ class PlotWrapper(QtWidgets.QWidget):
     def getWindow(self):
         return self
     
+    def getPlotWidth(self):
+        # Width of the axes in display pixels.
+        return int(self.ax.bbox.width)
+    
+    def onDraw(self, event):
+        # Every full draw (first show, resize, axis changes) refreshes the
+        # cached background.
+        if self.blit:
+            self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+    
+    def invalidateBackground(self):
+        # The next frame does a full draw, which re-captures the background.
+        # Only flags it, as the time range can change from the keyboard thread.
+        self.background = None
+    
+    def setChannels(self, chann_num, ticks):
+        for line in self.curves:
+            line.remove()
+        self.curves = []
+        for ch_ix in range(chann_num):
+            line, = self.ax.plot([],[], animated=self.blit)
+            self.curves.append(line)
+        tick_pos = []
+        tick_name = []
+        for tick in ticks[0]:
+            tick_pos.append(tick[0])
+            tick_name.append(tick[1])
+        self.ax.set(ylim=(-1.0 * chann_num, 1.0), yticks = tick_pos, yticklabels = tick_name)
+        self.invalidateBackground()
+    
     def updatePlotData(self, timeData, yData, scale):
+        instr = self.instrumentation
+        t0 = instr.clock()
         for ch in range(np.shape(yData)[0]):
             self.curves[ch].set_data(timeData, ((yData[ch,:])/scale)-np.shape(yData)[0]+ch+1)
-        self.canvas.draw()
+        instr.record("set_data", t0)
+        t0 = instr.clock()
+        if self.blit:
+            self.blitArtists()
+        else:
+            self.canvas.draw()
+        instr.record("draw", t0)
+        t0 = instr.clock()
         self.canvas.flush_events()
+        instr.record("flush", t0)
+    
+    def blitArtists(self):
+        if self.background is None:
+            # Renders the static artists and captures them through onDraw.
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+        for line in self.curves:
+            self.ax.draw_artist(line)
+        self.ax.draw_artist(self.markerLines)
+        for text in self.markerLabels:
+            if text.get_visible():
+                self.ax.draw_artist(text)
+        if self.overlay is not None:
+            self.ax.draw_artist(self.overlay)
+        # Marker labels sit above the axes, so blit the whole figure.
+        self.canvas.blit(self.figure.bbox)
+    
+    def setOverlayText(self, text):
+        if self.overlay is None:
+            self.overlay = self.ax.text(0.01, 0.99, "", transform=self.ax.transAxes,
+                                        verticalalignment='top', family='monospace',
+                                        fontsize=7, bbox={'facecolor': 'white', 'alpha': 0.7},
+                                        animated=self.blit)
+        self.overlay.set_text(text)
             
-    def addMarker(self, event, clock_val):
-        eventParam = {}
-        eventParam["ts"] = event[0]
-        markerLine = self.ax.axvline(x=eventParam["ts"]-clock_val, color=self.tableColorList[event[1]])
-        markerText = self.ax.text(eventParam["ts"]-clock_val, self.ax.get_ylim()[1]+0.1,
-                        event[2], fontsize=9, color=self.tableColorList[event[1]],
-                        horizontalalignment='center')
-        eventParam["line"] = markerLine
-        eventParam["text"] = markerText
-        self.markerList.append(eventParam)
-        #self.canvas.draw()
-        #self.canvas.flush_events()
+    def setMarkers(self, times, sources, names):
+        # times are relative to now and already culled to the visible range;
+        # sources index the marker streams, whose names are the labels.
+        ylim = self.ax.get_ylim()
+        segments = np.empty((np.size(times), 2, 2))
+        segments[:, :, 0] = np.asarray(times)[:, np.newaxis]
+        segments[:, 0, 1] = ylim[0]
+        segments[:, 1, 1] = ylim[1]
+        colors = [self.tableColorList[source % 6] for source in sources]
+        self.markerLines.set_segments(segments)
+        self.markerLines.set_color(colors)
         
-    def deleteMarker(self, markerNum):
-        self.markerList[markerNum]["line"].remove()
-        self.markerList[markerNum]["text"].remove()
-        self.markerList.remove(self.markerList[markerNum])
-        #self.canvas.draw()
-        #self.canvas.flush_events()
-        
-    def setNewValMarker(self, markerNum, newVal, plot_duration):
-        self.markerList[markerNum]["text"].set_x(newVal)
-        if newVal < - plot_duration:
-            self.markerList[markerNum]["text"].set_visible(False)
-        else:
-            self.markerList[markerNum]["text"].set_visible(True)
-        self.markerList[markerNum]["line"].set_xdata((newVal,newVal))
+        # Label only the newest markers.
+        first = max(0, np.size(times) - self.maxLabels)
+        for k in range(first, np.size(times)):
+            label = k - first
+            if label == len(self.markerLabels):
+                self.markerLabels.append(self.ax.text(0, 0, "", fontsize=9,
+                                                      horizontalalignment='center',
+                                                      animated=self.blit))
+            text = self.markerLabels[label]
+            text.set_position((times[k], ylim[1]+0.1))
+            text.set_text(names[sources[k]])
+            text.set_color(colors[k])
+            text.set_visible(True)
+        for text in self.markerLabels[np.size(times)-first:]:
+            text.set_visible(False)
         
     def decr_timerange(self):
         xlim_old = self.ax.get_xlim()
         xlim = (xlim_old[0]*0.9, 0.0)
         self.ax.set_xlim(xlim)
+        self.invalidateBackground()
         return xlim[0]
     
     def incr_timerange(self):
@@ -86,5 +167,58 @@ class PlotWrapper(QtWidgets.QWidget):
             newAxisVal = -self.maxTimeRange
         xlim = (newAxisVal, 0.0)
         self.ax.set_xlim(xlim)
+        self.invalidateBackground()
         return xlim[0]
-        
\ No newline at end of file
+        
+
+class SpectrumWrapper(QtWidgets.QWidget):
+    def __init__(self, plotParams, parent=None):
+        # Window next to the time series with the PSD of every channel
+        # (mode "psd") or a rolling spectrogram of their average ("spectrogram").
+        super(SpectrumWrapper, self).__init__(parent)
+        self.setWindowTitle('LSL Spectrum ' + plotParams["name"])
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_title(plotParams["name"])
+        self.mode = plotParams.get("mode", "psd")
+        self.fmax = plotParams["fmax"]
+        self.image = None
+        if self.mode == "spectrogram":
+            self.ax.set(xlabel='Time (s)', ylabel='Frequency (Hz)')
+        else:
+            # All channels in one line collection.
+            self.lines = LineCollection([], linewidths=0.5, colors='0.3')
+            self.ax.add_collection(self.lines)
+            self.ax.set(xlim=(0, self.fmax), xlabel='Frequency (Hz)', ylabel='Power (dB)')
+        self.canvas.draw()
+        self.show()
+
+    def getWindow(self):
+        return self
+
+    def updateDensity(self, freqs, psd):
+        segments = np.empty(np.shape(psd) + (2,))
+        segments[:, :, 0] = freqs
+        segments[:, :, 1] = 10*np.log10(np.maximum(psd, 1e-20))
+        self.lines.set_segments(segments)
+        ymin = np.min(segments[:, :, 1])
+        ymax = np.max(segments[:, :, 1])
+        self.ax.set_ylim(ymin - 1, ymax + 1)
+        self.canvas.draw_idle()
+
+    def updateSpectrogram(self, image, duration, fmax):
+        # image is (columns x freqs) in dB, oldest column first; NaN columns
+        # (not filled yet) are left blank.
+        valid = image[np.isfinite(image)]
+        if np.size(valid) == 0:
+            return
+        if self.image is None:
+            self.image = self.ax.imshow(image.T, origin='lower', aspect='auto', interpolation='nearest')
+        self.image.set_data(image.T)
+        self.image.set_extent((-duration, 0, 0, fmax))
+        self.image.set_clim(np.min(valid), np.max(valid))
+        self.canvas.draw_idle()
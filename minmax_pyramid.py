@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-resolution min/max history next to the full-rate ring buffer, so that
+plotting a long window reads about as many values as there are pixels.
+
+Level k keeps, for every block of factor**k samples, the minimum and the
+maximum of the block. Blocks are aligned to absolute sample numbers and each
+level is computed from the one below as soon as a block is complete, so an
+update only touches the samples written since the previous one.
+"""
+import numpy as np
+from ring_buffer import RingBuffer
+
+# Samples of a level block per sample (or block) of the level below.
+DEFAULT_FACTOR = 4
+# Levels are only kept while they hold at least this many blocks.
+MIN_LEVEL_SIZE = 4096
+
+class MinMaxPyramid:
+    def __init__(self, nchannels, size, factor=DEFAULT_FACTOR, min_size=MIN_LEVEL_SIZE, dtype=np.float64):
+        # size is the length of the full-rate buffer the levels summarize.
+        self.nchannels = nchannels
+        self.factor = int(factor)
+        # (factor of the level, min buffer, max buffer), finest first.
+        self.levels = []
+        blockSize = self.factor
+        while size//blockSize >= min_size:
+            n = size//blockSize
+            self.levels.append((blockSize, RingBuffer(nchannels, n, dtype=dtype),
+                                RingBuffer(nchannels, n, dtype=dtype)))
+            blockSize *= self.factor
+
+    def update(self, base, rows=slice(None), last=None):
+        # Add the blocks completed by the samples of base (a RingBuffer) up to
+        # sample last, level by level.
+        if last is None:
+            last = base.nsamples
+        below = (base, base, rows, last)
+        for blockSize, mins, maxs in self.levels:
+            belowMin, belowMax, belowRows, belowLast = below
+            first = mins.nsamples
+            # Skip the blocks whose samples below were already overwritten, as
+            # when the base buffer wrapped before the first update or while
+            # the updates fell behind.
+            held = -(-(belowLast - min(belowLast, belowMin.size))//self.factor)
+            if first < held:
+                first = mins.nsamples = maxs.nsamples = held
+            end = belowLast//self.factor
+            if end > first:
+                lo = belowMin.readRange(first*self.factor, end*self.factor, belowRows)
+                hi = lo if belowMax is belowMin else belowMax.readRange(first*self.factor, end*self.factor, belowRows)
+                shape = (np.shape(lo)[0], end - first, self.factor)
+                mins.write(np.amin(lo.reshape(shape), axis=2))
+                maxs.write(np.amax(hi.reshape(shape), axis=2))
+            below = (mins, maxs, slice(None), mins.nsamples)
+
+    def rebuild(self, base, rows=slice(None), last=None):
+        # Recompute every level from the samples base still holds, e.g. after
+        # the channels or the buffer changed.
+        if last is None:
+            last = base.nsamples
+        first = last - min(last, base.size)
+        for blockSize, mins, maxs in self.levels:
+            # First block entirely within the samples held below.
+            first = -(-first//self.factor)
+            for level in (mins, maxs):
+                level.reset()
+                level.nsamples = first
+        self.update(base, rows, last)
+
+    def reset(self):
+        for blockSize, mins, maxs in self.levels:
+            mins.reset()
+            maxs.reset()
+
+    def select(self, nsamples, ncolumns):
+        # Coarsest level that still has two blocks per column for a window of
+        # nsamples full-rate samples, or None if the full rate is needed.
+        selected = None
+        for k, (blockSize, mins, maxs) in enumerate(self.levels):
+            if nsamples//blockSize >= 2*ncolumns:
+                selected = k
+        return selected
+
+    def blockSize(self, level):
+        return self.levels[level][0]
+
+    def blocks(self, level):
+        # Number of complete blocks of the level.
+        return self.levels[level][1].nsamples
+
+    def read(self, level, nblocks, last, out=None):
+        # The last nblocks blocks before block number last, as interleaved
+        # (min, max, min, max, ...) values, the layout minMaxDecimate produces.
+        blockSize, mins, maxs = self.levels[level]
+        nblocks = min(int(nblocks), mins.size)
+        if out is None or np.shape(out) != (self.nchannels, 2*nblocks):
+            out = np.empty((self.nchannels, 2*nblocks), dtype=mins.buffer.dtype)
+        mins.read(nblocks, out=out[:, 0::2], last=last)
+        maxs.read(nblocks, out=out[:, 1::2], last=last)
+        return out
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial filters (montages) applied to every chunk at ingest as one matrix
+product: derived = M @ samples, with M of shape (derived channels x stream
+channels).
+
+Montages are built from the stream's channel labels (10-20 names are matched
+case-insensitively, with the old T3/T4/T5/T6 names as aliases) and cached per
+channel layout. The named montages are "average", "linked_mastoids",
+"double_banana" and "laplacian"; bipolar(), reference(), laplacian() and
+projection() build custom ones.
+"""
+import functools
+import numpy as np
+
+# Old 10-20 names of the temporal and parietal electrodes.
+ALIASES = {"T3": "T7", "T4": "T8", "T5": "P7", "T6": "P8"}
+MASTOIDS = (("M1", "M2"), ("A1", "A2"), ("TP9", "TP10"))
+DOUBLE_BANANA = [("Fp1", "F7"), ("F7", "T7"), ("T7", "P7"), ("P7", "O1"),
+                 ("Fp2", "F8"), ("F8", "T8"), ("T8", "P8"), ("P8", "O2"),
+                 ("Fp1", "F3"), ("F3", "C3"), ("C3", "P3"), ("P3", "O1"),
+                 ("Fp2", "F4"), ("F4", "C4"), ("C4", "P4"), ("P4", "O2"),
+                 ("Fz", "Cz"), ("Cz", "Pz")]
+# Nearest neighbours on the 10-20 system, for the small Laplacian.
+NEIGHBOURS_1020 = {"Fp1": ["F7", "F3", "Fp2"], "Fp2": ["Fp1", "F4", "F8"],
+                   "F7": ["Fp1", "F3", "T7"], "F3": ["Fp1", "F7", "Fz", "C3"],
+                   "Fz": ["F3", "F4", "Cz"], "F4": ["Fp2", "Fz", "F8", "C4"],
+                   "F8": ["Fp2", "F4", "T8"], "T7": ["F7", "C3", "P7"],
+                   "C3": ["F3", "T7", "Cz", "P3"], "Cz": ["Fz", "C3", "C4", "Pz"],
+                   "C4": ["F4", "Cz", "T8", "P4"], "T8": ["F8", "C4", "P8"],
+                   "P7": ["T7", "P3", "O1"], "P3": ["C3", "P7", "Pz", "O1"],
+                   "Pz": ["Cz", "P3", "P4"], "P4": ["C4", "Pz", "P8", "O2"],
+                   "P8": ["T8", "P4", "O2"], "O1": ["P7", "P3", "O2"],
+                   "O2": ["O1", "P4", "P8"]}
+# Matrices of at least this many stream channels and at most this density
+# are applied as scipy sparse matrices.
+SPARSE_MIN_CHANNELS = 64
+SPARSE_MAX_DENSITY = 0.1
+
+def channelIndex(labels):
+    # Index of every label, by normalized name.
+    index = {}
+    for k, label in enumerate(labels):
+        name = label.strip().upper()
+        index.setdefault(name, k)
+        alias = ALIASES.get(label.strip().capitalize())
+        if alias is not None:
+            index.setdefault(alias.upper(), k)
+    return index
+
+class Montage:
+    def __init__(self, name, matrix, labels):
+        # matrix is (len(labels) x stream channels); labels name the derived
+        # channels.
+        self.name = name
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.labels = list(labels)
+        if self.matrix.ndim != 2 or self.matrix.shape[0] != len(self.labels) or self.matrix.shape[0] == 0:
+            raise ValueError("Montage %s has no derived channels for this stream." % name)
+        self.selections = {}
+
+    def channel_count(self):
+        return len(self.labels)
+
+    def select(self, rows, dtype=np.float64):
+        # Operator for the derived channels rows (a slice), in dtype: a dense
+        # array, or a scipy sparse matrix when that is cheaper. Cached.
+        key = (rows.start, rows.stop, np.dtype(dtype).str)
+        if key not in self.selections:
+            matrix = self.matrix[rows].astype(dtype)
+            density = np.count_nonzero(matrix)/max(matrix.size, 1)
+            if matrix.shape[1] >= SPARSE_MIN_CHANNELS and density <= SPARSE_MAX_DENSITY:
+                from scipy import sparse
+                matrix = sparse.csr_matrix(matrix)
+            self.selections[key] = matrix
+        return self.selections[key]
+
+    def apply(self, y, rows=slice(None), dtype=np.float64):
+        # Derived channels rows of a (stream channels x samples) block.
+        return np.asarray(self.select(rows, dtype) @ y)
+
+
+def reference(labels, refs, name="reference"):
+    # Every channel but the references, minus the mean of the reference
+    # channels refs.
+    index = channelIndex(labels)
+    refs = [index[r.upper()] for r in refs if r.upper() in index]
+    if len(refs) == 0:
+        raise ValueError("No reference channel of montage %s in the stream." % name)
+    n = len(labels)
+    matrix = np.eye(n)
+    matrix[:, refs] -= 1.0/len(refs)
+    keep = [k for k in range(n) if k not in refs]
+    return Montage(name, matrix[keep], [labels[k] for k in keep])
+
+def commonAverage(labels):
+    n = len(labels)
+    return Montage("average", np.eye(n) - 1.0/n, labels)
+
+def linkedMastoids(labels):
+    index = channelIndex(labels)
+    for pair in MASTOIDS:
+        if all(m.upper() in index for m in pair):
+            return reference(labels, pair, "linked_mastoids")
+    raise ValueError("No mastoid channels (M1/M2, A1/A2 or TP9/TP10) in the stream.")
+
+def bipolar(labels, pairs, name="bipolar"):
+    # One derived channel a-b per pair whose channels are both in the stream.
+    index = channelIndex(labels)
+    rows = []
+    names = []
+    for a, b in pairs:
+        if a.upper() in index and b.upper() in index:
+            row = np.zeros(len(labels))
+            row[index[a.upper()]] += 1.0
+            row[index[b.upper()]] -= 1.0
+            rows.append(row)
+            names.append("%s-%s" % (a, b))
+    return Montage(name, np.reshape(rows, (len(rows), len(labels))), names)
+
+def laplacian(labels, neighbours=None, name="laplacian"):
+    # Every channel with at least two neighbours in the stream, minus the
+    # mean of those neighbours.
+    neighbours = NEIGHBOURS_1020 if neighbours is None else neighbours
+    index = channelIndex(labels)
+    rows = []
+    names = []
+    for centre, around in neighbours.items():
+        present = [index[n.upper()] for n in around if n.upper() in index]
+        if centre.upper() in index and len(present) >= 2:
+            row = np.zeros(len(labels))
+            row[present] = -1.0/len(present)
+            row[index[centre.upper()]] += 1.0
+            rows.append(row)
+            names.append(labels[index[centre.upper()]])
+    return Montage(name, np.reshape(rows, (len(rows), len(labels))), names)
+
+def projection(labels, mixing, unmixing, reject, name="projection"):
+    # Removes the components reject of an ICA (or any) decomposition:
+    # x - A[:, reject] W[reject] x, with mixing A and unmixing W.
+    mixing = np.asarray(mixing, dtype=np.float64)
+    unmixing = np.asarray(unmixing, dtype=np.float64)
+    reject = list(reject)
+    matrix = np.eye(len(labels)) - mixing[:, reject] @ unmixing[reject]
+    return Montage(name, matrix, labels)
+
+BUILDERS = {"average": commonAverage, "linked_mastoids": linkedMastoids,
+            "double_banana": lambda labels: bipolar(labels, DOUBLE_BANANA, "double_banana"),
+            "laplacian": laplacian}
+
+@functools.lru_cache(maxsize=32)
+def cachedMontage(name, labels):
+    return BUILDERS[name](list(labels))
+
+def montageFor(montage, labels):
+    # montage is a name of BUILDERS, a Montage, or None (no montage). A
+    # Montage must combine exactly the stream's channels (labels).
+    if isinstance(montage, Montage) and montage.matrix.shape[1] != len(labels):
+        raise ValueError("Montage %s combines %d channels, the stream has %d."
+                         % (montage.name, montage.matrix.shape[1], len(labels)))
+    if montage is None or isinstance(montage, Montage):
+        return montage
+    if montage not in BUILDERS:
+        raise ValueError("Unknown montage %s." % montage)
+    return cachedMontage(montage, tuple(labels))
@@ -1,145 +1,655 @@
+import threading
+import os
 import numpy as np
-from pylsl import StreamInlet, resolve_stream, local_clock
 from qtpy import QtCore, QtWidgets
 from stream_viewer import Dialog
 from markers_dialog import DialogMarkers
-from scipy.signal import lfilter, lfilter_zi
 from filter_BP import BandPassFilter
+from ring_buffer import RingBuffer
+from decimation import minMaxDecimate
+from minmax_pyramid import MinMaxPyramid
+from timestamp_buffer import Dejitterer, searchTimestamps, DEFAULT_DEJITTER_WINDOW
+from montage import montageFor
+from event_detection import EventDetector, KINDS
+from running_stats import RunningStats
+from marker_store import MarkerStore
+from instrumentation import Instrumentation, NULL_INSTRUMENTATION, DURATION_EDGES
+from acquisition import DEFAULT_ACQUISITION_RATE
+from session import Session
+from recorder import Recorder
+from data_source import InletSource, InletMarkerSource
+from stream_resolver import StreamResolver
 
 try:
     import keyboard
 except:
     print("keyboard module not found. Keyboard functionalities disabled.")
 
-def classifyStreamInlet(streams):
-    contStreamsNames = []
-    discStreamsNames = []
-    sortedStreams = {}
-    sortedStreams["continuous"] = []
-    sortedStreams["discrete"] = []
-    
-    for stream in streams:
-        stream_type = StreamInlet(stream).info().type()
-        if stream_type == "Markers" or stream_type == "Events" or stream_type == "Marker":
-            sortedStreams["discrete"].append(stream)
-            discStreamsNames.append(StreamInlet(stream).info().name())
-        else:
-            sortedStreams["continuous"].append(stream)
-            contStreamsNames.append(StreamInlet(stream).info().name())
-    return sortedStreams, contStreamsNames, discStreamsNames
-    
 class Plotter:
-    def __init__(self, windowParameters, checkedMarkers, sortedStreams):
-        #Initializes the stream chosen by the user.
+    def __init__(self, windowParameters, checkedMarkers, sortedStreams, session=None, source=None):
+        #Initializes the stream chosen by the user. Several plotters can share
+        #one session (acquisition worker and render timer); by default each
+        #plotter gets its own. source replaces the LSL stream by another data
+        #source (see data_source.py), whose marker sources checkedMarkers then
+        #index.
         self.plot_duration = windowParameters["init_time_range"]
         self.windowParameters = windowParameters
+        # Per-stage timing; the null object makes it free when turned off.
+        self.instrumentation = NULL_INSTRUMENTATION
+        if windowParameters.get("instrumentation", False):
+            self.instrumentation = Instrumentation()
+        self.showOverlay = windowParameters.get("instrumentation_overlay", True)
+        self.lastOverlay = 0.0
+        self.lastPull = None
 
         # create a new inlet to read from the stream
-        self.inlet = StreamInlet(sortedStreams["continuous"][windowParameters["stream_num"]],max_buflen=windowParameters["max_time_range"])
+        if source is None and windowParameters.get("acquisition_process", False):
+            # Acquire and filter in a separate process shared by all viewers
+            # of the stream; this plotter maps its buffer.
+            from shared_acquisition import SharedSource
+            source = SharedSource(sortedStreams["continuous"][windowParameters["stream_num"]], windowParameters)
+        elif source is None:
+            source = InletSource(sortedStreams["continuous"][windowParameters["stream_num"]], windowParameters["max_time_range"])
+        self.source = source
+        self.shared = getattr(source, "sharedBuffer", None)
         
         # Marker streams
         self.eventInlet = []
-        for num in checkedMarkers:
-            self.eventInlet.append(StreamInlet(sortedStreams["discrete"][num]))
+        if source.live:
+            for num in checkedMarkers:
+                self.eventInlet.append(InletMarkerSource(sortedStreams["discrete"][num]))
+        else:
+            markerSources = source.markerSources()
+            for num in checkedMarkers:
+                self.eventInlet.append(markerSources[num])
+        # Stream names are read once instead of once per event.
+        self.eventNames = [stream.name() for stream in self.eventInlet]
+        
+        # Optional spatial filter; channel_min and channel_max then index its
+        # derived channels.
+        self.montage = None
+        if windowParameters.get("montage") is not None and self.shared is not None:
+            print("Warning. Montages are not available with a separate acquisition process.")
+        elif windowParameters.get("montage") is not None:
+            self.montage = montageFor(windowParameters["montage"], self.streamLabels())
         
         self.channel_min = windowParameters["channel_min"]
-        self.channel_max = self.getHighestChannel(self.inlet.info().channel_count())
+        self.channel_max = self.getHighestChannel(self.channelCount())
         self.channel_num = (self.channel_max - self.channel_min) + 1
+        self.displayedLabels = self.channelLabels()[self.channel_min-1:self.channel_max]
         self.scale = windowParameters["init_data_scale"]
+        # Precision of the buffered, filtered and displayed samples.
+        self.sampleDtype = np.dtype(windowParameters.get("sample_dtype", "float64"))
         frequency_filter = [int(i) for i in windowParameters["frequency_filter"]]
-        self.B = BandPassFilter(frequency_filter, self.inlet.info().nominal_srate()).returnFilter()
+        if self.shared is None:
+            bandPassFilter = BandPassFilter(frequency_filter, self.source.nominal_srate(),
+                                            self.windowParameters.get("filter_type") == "iir")
+            self.B = bandPassFilter.returnFilter()
+            self.sos = bandPassFilter.returnSOS()
+            self.sosZi = bandPassFilter.returnSOSZi()
+        else:
+            # Filtered by the acquisition process.
+            self.B = np.asarray([])
+            self.sos = self.sosZi = None
         
         ticks = self.getPlotTicks()
         self.datareceived = False
+        # Guards the buffer and event list shared with the acquisition worker.
+        self.lock = threading.Lock()
+        # Held while a chunk is filtered and buffered, so the channel
+        # selection cannot change halfway through.
+        self.ingestLock = threading.Lock()
+        self.lastTimestamp = None
+        self.windowKey = None
+        # Everything a frame depends on; frames are only drawn when it changes.
+        self.frameKey = None
+        # Streams without a nominal rate are plotted against their per-sample
+        # timestamps; timestamp_axis forces it on or off.
+        self.timestamped = self.windowParameters.get("timestamp_axis", self.source.nominal_srate() == 0)
+        # Post-processing is done incrementally at ingest unless disabled.
+        # A shared buffer is written by another process, and timestamp windows
+        # vary in length: post-process in batch.
+        self.incremental = self.windowParameters.get("incremental_stats", True) and self.shared is None \
+            and not self.timestamped
+        self.stats = None
         self.str_buffer = self.create_buffer()
-        self.eventList = []
-        self.configureTimers()
+        self.markerStore = MarkerStore()
+        # Optional spectral view ("psd" or "spectrogram"), estimated from the
+        # buffer on the acquisition worker.
+        self.spectrumMode = self.windowParameters.get("spectrum")
+        self.spectrum = None
+        self.spectrumVersion = None
+        if self.spectrumMode:
+            self.spectrum = self.createSpectrum()
+        # Optional detection of artifacts in the filtered chunks. Detections
+        # are markers of extra sources, after those of the marker streams,
+        # and can be published on an LSL marker outlet.
+        self.detector = None
+        self.detectionOutlet = None
+        if self.windowParameters.get("detection") and self.shared is not None:
+            print("Warning. Event detection is not available with a separate acquisition process.")
+        elif self.windowParameters.get("detection"):
+            self.detector = self.createDetector()
+            self.eventNames = self.eventNames + list(KINDS)
+            if self.windowParameters.get("detection_outlet", False):
+                self.detectionOutlet = self.createDetectionOutlet()
         
         if self.windowParameters["plot_library"] == 0:
-            from matplotlib_wrapper import PlotWrapper
+            from matplotlib_wrapper import PlotWrapper, SpectrumWrapper
         else:
-            from pyqtgraph_wrapper import PlotWrapper
+            from pyqtgraph_wrapper import PlotWrapper, SpectrumWrapper
         
-        plotParams = {"name":self.inlet.info().name(), 
+        plotParams = {"name":self.source.name(), 
                       "max_time_range": windowParameters["max_time_range"],
                       "init_time_range": windowParameters["init_time_range"],
-                      "chann_num": self.channel_num, "ticks": ticks}
+                      "chann_num": self.channel_num, "ticks": ticks,
+                      "instrumentation": self.instrumentation,
+                      "single_item": windowParameters.get("single_item", True),
+                      "blit": windowParameters.get("blit", True),
+                      "channel_colors": windowParameters.get("channel_colors")}
         self.plotWrapper = PlotWrapper(plotParams)
         self.win = self.plotWrapper.getWindow()
-        self.timerPlot.start(int(1000.0/self.windowParameters["refresh_rate"]))
+        self.spectrumWrapper = None
+        if self.spectrum is not None:
+            self.spectrumFmax = min(self.windowParameters.get("spectrum_fmax", np.inf), self.str_buffer.srate/2)
+            self.spectrumWrapper = SpectrumWrapper({"name": self.source.name(), "mode": self.spectrumMode,
+                                                    "fmax": self.spectrumFmax})
+        
+        # Optional copy of the raw and displayed data on disk.
+        self.recorder = None
+        if self.windowParameters.get("record_path") and self.shared is not None:
+            print("Warning. Recording is not available with a separate acquisition process.")
+        elif self.windowParameters.get("record_path"):
+            self.recorder = Recorder(self.windowParameters["record_path"], self.source.nominal_srate(),
+                                     self.eventNames, self.source.name(), self.source.channelLabels())
+            self.recorder.start()
+            app = QtWidgets.QApplication.instance()
+            if app is not None:
+                app.aboutToQuit.connect(self.recorder.stop)
         
-    def configureTimers(self):
-        self.timerPlot = QtCore.QTimer()
-        self.timerPlot.timeout.connect(self.updateData)
+        # Pull, filter and buffer on the session's worker thread; the session's
+        # GUI timer only renders.
+        if session is None:
+            session = Session(self.windowParameters.get("acquisition_rate", DEFAULT_ACQUISITION_RATE))
+        self.session = session
+        self.session.addPlotter(self, self.windowParameters["refresh_rate"])
+    
+    def stop(self):
+        self.session.removePlotter(self)
+        if self.shared is not None:
+            self.source.close()
+        if self.recorder is not None:
+            self.recorder.stop()
     
     def create_buffer(self):
-        str_buffer={}
-        if self.inlet.info().nominal_srate() > 0:
-            str_buffer["srate"] = self.inlet.info().nominal_srate()
-            if str_buffer["srate"] < self.windowParameters["sampling_rate"]:
-                self.windowParameters["sampling_rate"] = str_buffer["srate"]
+        if self.source.nominal_srate() > 0:
+            srate = self.source.nominal_srate()
+            if srate < self.windowParameters["sampling_rate"]:
+                self.windowParameters["sampling_rate"] = srate
                 print("Warning. User-specified sampling rate was higher than stream rate.")
         else:
-            str_buffer["srate"] = self.windowParameters["sampling_rate"]
+            srate = self.windowParameters["sampling_rate"]
+        
+        if self.shared is not None:
+            # The shared buffer holds every channel; the plot reads the
+            # filtered rows of the displayed ones.
+            self.rawBuffer = None
+            self.filter = None
+            self.dejitterer = None
+            if self.windowParameters.get("dejitter", False):
+                print("Warning. Dejittering is not available with a separate acquisition process.")
+            # The first row holds the timestamps.
+            self.timeBuffer = self.shared
+            self.timeRows = slice(0, 1)
+            self.bufferRows = self.source.filteredRows(self.channel_min, self.channel_max)
+            self.pyramid = self.createPyramid(self.shared.size, self.shared.buffer.dtype)
+            if self.pyramid is not None:
+                # The shared buffer may have been filled for a while already.
+                self.pyramid.rebuild(self.shared, self.bufferRows)
+            return self.shared
+        self.bufferRows = slice(None)
         
-        str_buffer["buffer"] = np.zeros((self.inlet.info().channel_count(), 
-                                         int(max(max(self.windowParameters["max_time_range"], self.windowParameters["init_time_range"])*str_buffer["srate"],100))))
-        str_buffer["nsamples"] = 0
+        # Only the displayed channels are filtered and buffered. The raw buffer
+        # keeps every channel unfiltered, to backfill channels that are added
+        # to the display later on.
+        buffersize = int(max(max(self.windowParameters["max_time_range"], self.windowParameters["init_time_range"])*srate,100))
         
-        if self.B.size != 0:
-            filter_init_z = lfilter_zi(self.B,np.asarray(1))
-            self.z = np.zeros([self.inlet.info().channel_count(),len(filter_init_z)])
-            for n in range(self.inlet.info().channel_count()):
-                self.z[n,:] = filter_init_z[:]
+        # scipy is only imported once a filter is actually used.
+        self.filter = None
+        if self.sos is not None:
+            from streaming_filter import StreamingFilter
+            self.filter = StreamingFilter(self.channel_num, sos=self.sos, zi=self.sosZi, dtype=self.sampleDtype)
+        elif self.B.size != 0:
+            from streaming_filter import StreamingFilter
+            self.filter = StreamingFilter(self.channel_num, self.B, dtype=self.sampleDtype)
+        
+        dtype = self.storageDtype(self.montage)
+        str_buffer = RingBuffer(self.channel_num, buffersize, srate, dtype)
+        self.rawBuffer = None
+        if self.windowParameters.get("raw_buffer", True):
+            # Raw samples keep the stream's format.
+            self.rawBuffer = RingBuffer(self.source.channel_count(), buffersize, srate,
+                                        self.source.sampleDtype())
+        self.pyramid = self.createPyramid(buffersize, dtype)
+        # Timestamp of every buffered sample, written along with the data.
+        self.timeBuffer = None
+        self.timeRows = slice(None)
+        if self.timestamped:
+            self.timeBuffer = RingBuffer(1, buffersize)
+        self.dejitterer = None
+        if self.windowParameters.get("dejitter", False):
+            self.dejitterer = Dejitterer(self.windowParameters.get("dejitter_window", DEFAULT_DEJITTER_WINDOW))
         
         return str_buffer
 
-    def updateData(self):
+    def storageDtype(self, montage):
+        # Samples are stored in sample_dtype, except unfiltered integer samples,
+        # which are stored as they arrive.
+        native = np.dtype(self.source.sampleDtype())
+        if self.filter is None and montage is None and native.kind in "iu" and \
+           not (self.incremental and self.windowParameters["common_average"] is True):
+            return native
+        return self.sampleDtype
+    
+    def createPyramid(self, size, dtype):
+        # Min/max levels for long windows; None when the buffer is too short
+        # for any level to pay off.
+        if not self.windowParameters.get("history_pyramid", True) or self.timestamped:
+            return None
+        pyramid = MinMaxPyramid(self.channel_num, size, dtype=dtype)
+        return pyramid if pyramid.levels else None
+
+    def acquire(self):
+        # Called from the acquisition worker.
         self.updateDataContinuousStream()
+        if self.pyramid is not None:
+            instr = self.instrumentation
+            t0 = instr.clock()
+            with self.lock:
+                self.pyramid.update(self.str_buffer, self.bufferRows)
+            instr.record("pyramid", t0)
         self.updateDataEvents()
-        self.updatePlot()
+        if self.spectrum is not None:
+            self.updateSpectrum()
+    
+    def createSpectrum(self):
+        from spectrum import SpectralEstimator, DEFAULT_AVERAGE_TIME
+        return SpectralEstimator(self.channel_num, self.str_buffer.srate, self.windowParameters.get("spectrum_nfft"),
+                                 average_time=self.windowParameters.get("spectrum_average", DEFAULT_AVERAGE_TIME),
+                                 max_nfft=self.str_buffer.size)
+    
+    def createDetector(self):
+        # detection holds the keyword arguments of EventDetector.
+        return EventDetector(self.channel_num, self.str_buffer.srate, dtype=self.sampleDtype,
+                             **self.windowParameters["detection"])
+    
+    def createDetectionOutlet(self):
+        from pylsl import StreamInfo, StreamOutlet
+        name = self.source.name() + " detections"
+        info = StreamInfo(name, "Markers", 1, 0, "string", name.replace(" ", "_") + "_" + str(os.getpid()))
+        return StreamOutlet(info)
+    
+    def detectEvents(self, y, timestamps):
+        # Called at ingest with the filtered chunk, before it is buffered.
+        events = self.detector.process(y, timestamps)
+        if len(events) == 0:
+            return
+        base = len(self.eventInlet)
+        times = np.array([t for kind, t, channels in events])
+        sources = np.array([base + kind for kind, t, channels in events])
+        with self.lock:
+            for source in np.unique(sources):
+                self.markerStore.add(times[sources == source], source)
+        if self.recorder is not None:
+            for source in np.unique(sources):
+                self.recorder.putMarkers(times[sources == source], source)
+        if self.detectionOutlet is not None:
+            for kind, t, channels in events:
+                self.detectionOutlet.push_sample([KINDS[kind] + " " + " ".join(self.displayedLabels[c] for c in channels)], t)
+    
+    def updateSpectrum(self):
+        # Transforms only the segments completed since the last call. Runs on
+        # the acquisition worker, so it never delays a frame; the ingest lock
+        # keeps the channel selection fixed meanwhile.
+        instr = self.instrumentation
+        t0 = instr.clock()
+        with self.ingestLock:
+            if self.spectrum.update(self.str_buffer, self.bufferRows, self.str_buffer.nsamples):
+                instr.record("spectrum", t0)
+
+    def updateData(self, now=None):
+        # Called from the GUI timer. now is the local_clock() reading shared by
+        # every plotter of the session. Returns True if a frame was drawn.
+        if now is None or not self.source.live:
+            # A replayed source runs on its own clock.
+            now = self.source.clock()
+        spectrumDrawn = self.updateSpectrumPlot()
+        frameKey = (self.str_buffer.nsamples, self.scale, self.plot_duration,
+                    self.markerStore.version, self.channel_min, self.channel_max, self.montage,
+                    self.plotWrapper.getPlotWidth(),
+                    # The window of a timestamp axis moves with the clock.
+                    now if self.timestamped else None)
+        if frameKey == self.frameKey:
+            return spectrumDrawn
+        instr = self.instrumentation
+        t0 = instr.clock()
+        if not self.updateWindow(now):
+            return spectrumDrawn
+        self.frameKey = frameKey
+        self.updatePlot(now)
+        instr.record("frame", t0)
+        return True
+    
+    def updateSpectrumPlot(self):
+        # Redraw the spectral view when the estimate changed.
+        spectrum = self.spectrum
+        if spectrum is None or spectrum.version == self.spectrumVersion:
+            return False
+        self.spectrumVersion = spectrum.version
+        instr = self.instrumentation
+        t0 = instr.clock()
+        if self.spectrumMode == "spectrogram":
+            nfreqs = int(np.searchsorted(spectrum.freqs, self.spectrumFmax, side="right"))
+            duration = len(spectrum.history)*spectrum.hop/spectrum.srate
+            self.spectrumWrapper.updateSpectrogram(spectrum.spectrogram()[:, :nfreqs], duration, self.spectrumFmax)
+        else:
+            density = spectrum.density(self.spectrumFmax)
+            if density is None:
+                return False
+            self.spectrumWrapper.updateDensity(*density)
+        instr.record("spectrum_render", t0)
+        return True
+    
+    def frameStats(self):
+        return self.session.frameStats()
         
     def updateDataContinuousStream(self):
-        # Read data from the inlet. Use a timeout of 0.0 so we don't block GUI interaction.
-        chunk, timestamps = self.inlet.pull_chunk()
-        if timestamps:
-            self.datareceived = True
-            ts = np.asarray(timestamps)
-            y = np.asarray(chunk).transpose()
-            y[np.logical_not(np.isfinite(y))] = 0.0
-            
-            if len(np.shape(y))==1:
-                y=y[np.newaxis,:]
-            
-            if self.B.size != 0:
-                if self.z is None:
-                    self.z = lfilter_zi(self.B,np.asarray(1))
-                filteredSample, self.z = lfilter(self.B,np.asarray(1),y, zi = self.z)
-                y = filteredSample
-            
-            # append to buffer
-            buffersize = np.shape(self.str_buffer["buffer"])[1]
-            nsamples = self.str_buffer["nsamples"]
-            #print(nsamples)
-            self.str_buffer["buffer"][:, np.remainder(np.arange(nsamples, nsamples + np.shape(y)[1]), buffersize)] = y
-            self.str_buffer["nsamples"] += np.shape(y)[1]
-            #print(np.remainder(np.arange(nsamples, nsamples + np.shape(y)[1]), np.shape(self.str_buffer["buffer"])[1]))
+        # Read data from the inlet. Use a timeout of 0.0 so we don't block the worker.
+        instr = self.instrumentation
+        t0 = instr.clock()
+        y, timestamps = self.source.pull()
+        instr.record("pull", t0)
+        if instr is not NULL_INSTRUMENTATION:
+            self.recordBacklog(timestamps)
+        if timestamps is not None:
+            rawTimestamps = timestamps
+            if self.dejitterer is not None:
+                timestamps = self.dejitterer.process(timestamps)
+            with self.ingestLock:
+                raw = y
+                if self.rawBuffer is not None:
+                    self.rawBuffer.write(y)
+                t0 = instr.clock()
+                rows = slice(self.channel_min-1, self.channel_max)
+                if self.montage is not None:
+                    # Derived channels, in one matrix product per chunk.
+                    y = self.montage.apply(y, rows, self.sampleDtype)
+                    instr.record("montage", t0)
+                    t0 = instr.clock()
+                else:
+                    y = y[rows]
+                if self.filter is not None:
+                    y = self.filter.process(y)
+                if self.incremental and self.windowParameters["common_average"] is True:
+                    # Common average is per sample, so it is applied once at ingest.
+                    y = y - np.mean(y, axis=0)[np.newaxis,:]
+                instr.record("filter", t0)
+                if self.detector is not None:
+                    t0 = instr.clock()
+                    self.detectEvents(y, timestamps)
+                    instr.record("detect", t0)
+                if self.recorder is not None:
+                    self.recorder.put(raw, y, rawTimestamps, self.channel_min, self.channel_max)
+                
+                # append to buffer
+                t0 = instr.clock()
+                with self.lock:
+                    self.updateStats(y)
+                    if self.timeBuffer is not None:
+                        self.timeBuffer.write(np.reshape(timestamps, (1, -1)))
+                    self.lastTimestamp = np.amax(timestamps)
+                    self.datareceived = True
+                instr.record("buffer", t0)
+    
+    def recordBacklog(self, timestamps):
+        # Samples pulled against samples expected since the previous pull, and
+        # how old the newest pulled sample is.
+        now = self.source.clock()
+        if self.lastPull is not None and self.str_buffer.srate > 0:
+            expected = (now - self.lastPull)*self.str_buffer.srate
+            pulled = 0 if timestamps is None else len(timestamps)
+            if expected > 0:
+                self.instrumentation.recordValue("pull_ratio", pulled/expected)
+        self.lastPull = now
+        if timestamps is not None:
+            self.instrumentation.recordValue("inlet_lag", now - timestamps[-1], DURATION_EDGES)
+    
+    def updateStats(self, y):
+        # Keep the windowed sums of the plotted window up to date; called with
+        # the lock held, before y is written to the buffer.
+        stats = self.stats
+        if stats is None:
+            self.str_buffer.write(y)
+            return
+        n = np.shape(y)[1]
+        nsamples = self.str_buffer.nsamples
+        if n < stats.window:
+            stats.update(y, self.str_buffer.readRange(nsamples-stats.window, nsamples-stats.window+n))
+        self.str_buffer.write(y)
+        if n >= stats.window or stats.needsReset():
+            stats.reset(self.str_buffer.read(stats.window))
+    
+    def resetStats(self, window):
+        # Called with the lock held when the window length or channels change.
+        self.stats = None
+        if self.incremental and (self.windowParameters["standardize"] is True or self.windowParameters["zero_mean"] is True):
+            self.stats = RunningStats(self.channel_num, window)
+            self.stats.reset(self.str_buffer.read(window))
+    
+    def setChannelRange(self, channel_min, channel_max):
+        # Change the displayed channels at runtime. Channels that stay on
+        # screen keep their buffer and filter state; new ones are backfilled
+        # by filtering their history in the raw buffer.
+        self.changeChannels(channel_min, channel_max, self.montage)
+    
+    def setMontage(self, montage):
+        # Switch the montage at runtime: a name of montage.BUILDERS, a
+        # Montage, or None for the stream's own channels. The displayed
+        # channels are rebuilt from the raw buffer. Raises ValueError if the
+        # montage does not fit the stream's channels.
+        if self.shared is not None:
+            print("Warning. Montages are not available with a separate acquisition process.")
+            return
+        self.changeChannels(self.channel_min, self.channel_max, montageFor(montage, self.streamLabels()))
+    
+    def changeChannels(self, channel_min, channel_max, montage):
+        count = montage.channel_count() if montage is not None else self.source.channel_count()
+        channel_max = min(channel_max, count)
+        channel_min = max(1, min(channel_min, channel_max))
+        if self.shared is not None:
+            # Every channel is already filtered in the shared buffer.
+            with self.ingestLock, self.lock:
+                self.channel_min = channel_min
+                self.channel_max = channel_max
+                self.channel_num = channel_max - channel_min + 1
+                self.displayedLabels = self.channelLabels()[channel_min-1:channel_max]
+                self.bufferRows = self.source.filteredRows(channel_min, channel_max)
+                self.windowKey = None
+                self.rebuildPyramid()
+                if self.spectrum is not None:
+                    self.spectrum = self.createSpectrum()
+            self.plotWrapper.setChannels(self.channel_num, self.getPlotTicks())
+            return
+        with self.ingestLock, self.lock:
+            channel_num = channel_max - channel_min + 1
+            str_buffer = RingBuffer(channel_num, self.str_buffer.size, self.str_buffer.srate,
+                                    self.storageDtype(montage))
+            str_buffer.nsamples = self.str_buffer.nsamples
+            new_filter = None
+            if self.filter is not None:
+                new_filter = self.filter.resized(channel_num)
             
-            samples_to_get = min(np.shape(self.str_buffer["buffer"])[1], int(round(self.str_buffer["srate"]*self.plot_duration)))
-            channels_to_get = np.arange(self.channel_min-1,self.channel_max)
-            samples_indexes = np.remainder(np.arange(nsamples-samples_to_get,nsamples,int(self.str_buffer["srate"]/self.windowParameters["sampling_rate"])),np.shape(self.str_buffer["buffer"])[1])
-            #print(samples_indexes[-10:-1])
-            #print(self.str_buffer["buffer"][1,samples_indexes[-10:-1]])
-            self.yData = self.str_buffer["buffer"][channels_to_get[:,np.newaxis], samples_indexes[np.newaxis,:]]
+            keep_min = max(channel_min, self.channel_min)
+            keep_max = min(channel_max, self.channel_max)
+            common_average = self.incremental and self.windowParameters["common_average"] is True
+            if (common_average or montage is not self.montage) and self.rawBuffer is not None:
+                # The stored common average depends on the channel set, and
+                # another montage derives other channels: rebuild them all.
+                keep_min, keep_max = channel_max+1, channel_max
+            elif montage is not self.montage:
+                # Nothing to derive the new channels from: they start from
+                # zeros and a filter in its initial state rather than show
+                # the old montage's samples under the new labels.
+                keep_min, keep_max = channel_max+1, channel_max
+            if keep_min <= keep_max:
+                rows = slice(keep_min-channel_min, keep_max-channel_min+1)
+                old_rows = slice(keep_min-self.channel_min, keep_max-self.channel_min+1)
+                str_buffer.buffer[rows] = self.str_buffer.buffer[old_rows]
+                if new_filter is not None:
+                    new_filter.copyState(rows, self.filter, old_rows)
+                missing = [(channel_min, keep_min-1), (keep_max+1, channel_max)]
+            else:
+                missing = [(channel_min, channel_max)]
             
-            if len(np.shape(self.yData))==1:
-                self.yData = self.yData[np.newaxis,:]
-                
-            [nchan, npoints] = np.shape(self.yData)
-            xmax = np.amax(ts) - local_clock()
-            xmin = xmax - (samples_to_get-1)/self.str_buffer["srate"]
+            for first, last in missing:
+                if first <= last:
+                    self.backfillChannels(str_buffer, new_filter, channel_min, first, last, montage)
+            if common_average and self.rawBuffer is not None:
+                for part in str_buffer.views(min(str_buffer.nsamples, str_buffer.size)):
+                    part -= np.mean(part, axis=0)[np.newaxis,:]
             
-            ## POST-PROCESS ##
+            self.str_buffer = str_buffer
+            self.filter = new_filter
+            self.montage = montage
+            self.channel_min = channel_min
+            self.channel_max = channel_max
+            self.channel_num = channel_num
+            self.displayedLabels = self.channelLabels()[channel_min-1:channel_max]
+            self.windowKey = None
+            self.rebuildPyramid()
+            if self.stats is not None:
+                self.resetStats(self.stats.window)
+            if self.spectrum is not None:
+                self.spectrum = self.createSpectrum()
+            if self.detector is not None:
+                self.detector = self.createDetector()
+        self.plotWrapper.setChannels(self.channel_num, self.getPlotTicks())
+    
+    def rebuildPyramid(self):
+        # Called with the locks held once the channels changed.
+        if self.pyramid is not None:
+            self.pyramid = self.createPyramid(self.str_buffer.size, self.str_buffer.buffer.dtype)
+            self.pyramid.rebuild(self.str_buffer, self.bufferRows)
+    
+    def backfillChannels(self, str_buffer, new_filter, channel_min, first, last, montage):
+        rows = slice(first-channel_min, last-channel_min+1)
+        if self.rawBuffer is None:
+            return
+        n = min(self.rawBuffer.nsamples, self.rawBuffer.size)
+        if montage is not None:
+            y = montage.apply(self.rawBuffer.read(n), slice(first-1, last), self.sampleDtype)
+        else:
+            y = self.rawBuffer.read(n, slice(first-1, last))
+        if new_filter is not None:
+            warmup = new_filter.resized(last-first+1)
+            y = warmup.process(y)
+            new_filter.copyState(rows, warmup, slice(None))
+        str_buffer.assign(y, rows)
+    
+    def updateWindow(self, now):
+        # Snapshot the latest window of the buffer for rendering.
+        instr = self.instrumentation
+        t0 = instr.clock()
+        step = max(1, int(self.str_buffer.srate/self.windowParameters["sampling_rate"]))
+        ncolumns = 0
+        if self.windowParameters.get("minmax_decimation", True):
+            # Read at full rate and reduce to min/max envelopes instead of
+            # stride picking. sampling_rate still bounds the points per second.
+            ncolumns = self.plotWrapper.getPlotWidth()
+        with self.lock:
+            # Everything below refers to this snapshot of the sample count.
+            last = self.str_buffer.nsamples
+            if self.shared is not None and last > 0:
+                # Written by the acquisition process: the newest time comes
+                # from the timestamp row.
+                self.lastTimestamp = self.source.timestampAt(last-1)
+                self.datareceived = True
+            if self.datareceived is False:
+                return False
+            samples_to_get = min(self.str_buffer.size, int(round(self.str_buffer.srate*self.plot_duration)))
+            if ncolumns > 0:
+                ncolumns = min(ncolumns, samples_to_get//step)
+                step = 1
+            lastTimestamp = self.lastTimestamp
+            if self.incremental and (self.stats is None or self.stats.window != samples_to_get):
+                self.resetStats(samples_to_get)
+            if self.stats is not None:
+                mean = self.stats.mean().astype(self.sampleDtype)
+                std = self.stats.std().astype(self.sampleDtype)
+            level = None
+            if self.timestamped:
+                # The window starts with the first sample in the time range.
+                first = searchTimestamps(self.timeBuffer, now - self.plot_duration, last, self.timeRows)
+                first = min(first, last - 1)
+                samples_to_get = last - first
+                ncolumns = min(ncolumns, samples_to_get)
+                windowKey = (first, last, ncolumns, self.bufferRows)
+            else:
+                if ncolumns > 0 and self.pyramid is not None and \
+                   (self.incremental or self.windowParameters["common_average"] is not True):
+                    # The common average of min/max envelopes would be wrong, so
+                    # it is only taken from the pyramid once applied at ingest.
+                    level = self.pyramid.select(samples_to_get, ncolumns)
+                if level is not None:
+                    # Long window: read the min/max blocks of a pyramid level. The
+                    # window ends with the newest complete block.
+                    blockSize = self.pyramid.blockSize(level)
+                    end = min(last//blockSize, self.pyramid.blocks(level))
+                    lastTimestamp -= (last - end*blockSize)/self.str_buffer.srate
+                    windowKey = (end, samples_to_get, level, ncolumns, self.bufferRows)
+                else:
+                    windowKey = (last, samples_to_get, step, ncolumns, self.bufferRows)
+            # Nothing changed since the last frame: only the time axis moves.
+            newWindow = windowKey != self.windowKey
+            if newWindow:
+                self.windowKey = windowKey
+                if self.timestamped:
+                    self.rawData = self.str_buffer.readRange(first, last, self.bufferRows,
+                                                             getattr(self, "rawData", None))
+                    self.rawTimes = self.timeBuffer.readRange(first, last, self.timeRows,
+                                                              getattr(self, "rawTimes", None))
+                elif level is not None:
+                    self.rawData = self.pyramid.read(level, samples_to_get//blockSize, end,
+                                                     getattr(self, "rawData", None))
+                else:
+                    self.rawData = self.str_buffer.read(samples_to_get, self.bufferRows, step,
+                                                        getattr(self, "rawData", None), last)
+        
+        instr.record("gather", t0)
+        [nchan, npoints] = np.shape(self.rawData)
+        xmax = lastTimestamp - now
+        xmin = xmax - (samples_to_get-1)/self.str_buffer.srate
+        if not newWindow:
+            self.timeData += xmax - self.xmax
+            self.xmax = xmax
+            return True
+        self.xmax = xmax
+        
+        t0 = instr.clock()
+        self.yData = self.rawData
+        if self.yData.dtype.kind in "iu":
+            # Integer samples are converted once per window.
+            self.yData = self.yData.astype(self.sampleDtype)
+        ## POST-PROCESS ##
+        if self.incremental:
+            # Common average was applied at ingest; mean and standard deviation
+            # come from the running window statistics.
+            if(self.windowParameters["zero_mean"] is True):
+                self.yData = self.yData-mean[:,np.newaxis]
+            if(self.windowParameters["standardize"] is True):
+                std[std == 0] = 1.0
+                self.yData = self.yData*(1/std)[:,np.newaxis]
+        else:
             if(self.windowParameters["common_average"] is True):
                 self.common_average()
             
@@ -148,40 +658,87 @@ class Plotter:
                 
             if(self.windowParameters["zero_mean"] is True):
                 self.zero_average()
-                
+            
+        if self.timestamped:
+            # Samples sit at their own timestamps, on the clock of the markers.
+            self.timeData = self.rawTimes[0] - now
+        else:
             self.timeData = np.linspace(xmin,xmax,npoints)
+        instr.record("postproc", t0)
+        
+        ## DISPLAY DECIMATION ##
+        if ncolumns > 0:
+            t0 = instr.clock()
+            self.timeData, self.yData = minMaxDecimate(self.timeData, self.yData, ncolumns)
+            instr.record("decimate", t0)
+        return True
         
     def updateDataEvents(self):
-        for stream in self.eventInlet:
+        for num, stream in enumerate(self.eventInlet):
             chunk, timestamps = stream.pull_chunk(timeout=0.0)
             if timestamps:
-                ts = np.asarray(timestamps)
-                    
-                for n in range(np.size(ts)):
-                    event = []
-                    event.append(float(ts[n]))
-                    event.append(self.eventInlet.index(stream)%6)
-                    event.append(stream.info().name())
-                    self.eventList.append(event)
+                with self.lock:
+                    self.markerStore.add(timestamps, num)
+                if self.recorder is not None:
+                    self.recorder.putMarkers(timestamps, num)
                         
-    def updatePlot(self):
+    def updatePlot(self, now):
         if (self.datareceived is True):
-            clock_val = local_clock()
+            clock_val = now
+            instr = self.instrumentation
             
-            self.plotWrapper.updatePlotData(self.timeData, self.yData, self.scale)
+            # Markers first, so they are part of the same redraw as the data.
+            t0 = instr.clock()
+            with self.lock:
+                self.markerStore.evictBefore(clock_val - self.windowParameters["max_time_range"])
+                times, sources = self.markerStore.window(clock_val - self.plot_duration, clock_val)
+            self.plotWrapper.setMarkers(times - clock_val, sources, self.eventNames)
+            instr.record("markers", t0)
             
-            for i in reversed(range(len(self.plotWrapper.markerList))):
-                newMarkerTs = self.plotWrapper.markerList[i]["ts"] - clock_val
-                
-                if newMarkerTs < - self.windowParameters["max_time_range"]:
-                    self.plotWrapper.deleteMarker(i)
-                else:
-                    self.plotWrapper.setNewValMarker(i, newMarkerTs, self.plot_duration)
+            t0 = instr.clock()
+            self.plotWrapper.updatePlotData(self.timeData, self.yData, self.scale)
+            instr.record("render", t0)
             
-            for event in self.eventList:
-                self.plotWrapper.addMarker(event, clock_val)
-                
-            self.eventList.clear()
+            if instr is not NULL_INSTRUMENTATION and self.showOverlay and now - self.lastOverlay > 0.5:
+                self.lastOverlay = now
+                self.plotWrapper.setOverlayText(instr.overlayText())
+    
+    def seek(self, t):
+        # Jump to time t of a replayed source. The buffers restart empty and
+        # are refilled with the window leading up to t.
+        with self.ingestLock, self.lock:
+            self.source.seek(t, self.str_buffer.size/self.str_buffer.srate)
+            self.str_buffer.reset()
+            if self.rawBuffer is not None:
+                self.rawBuffer.reset()
+            if self.pyramid is not None:
+                self.pyramid.reset()
+            if self.timeBuffer is not None and self.shared is None:
+                self.timeBuffer.reset()
+            if self.dejitterer is not None:
+                self.dejitterer.reset()
+            if self.filter is not None:
+                self.filter = self.filter.resized(self.channel_num)
+            self.stats = None
+            self.windowKey = None
+            self.frameKey = None
+            self.lastTimestamp = None
+            self.datareceived = False
+            self.markerStore = MarkerStore()
+            if self.spectrum is not None:
+                self.spectrum.reset()
+            if self.detector is not None:
+                self.detector.reset()
+    
+    def exportInstrumentation(self, path):
+        # Write the stage timings to a .csv or .json file.
+        if self.instrumentation is NULL_INSTRUMENTATION:
+            raise ValueError("Instrumentation is disabled: set instrumentation in the window parameters "
+                             "to export stage timings.")
+        if path.lower().endswith(".csv"):
+            self.instrumentation.exportCSV(path)
+        else:
+            self.instrumentation.exportJSON(path)
                 
     def getHighestChannel(self, channel_count):
         if(channel_count < self.windowParameters["channel_max"]):
@@ -190,21 +747,32 @@ class Plotter:
             channel_max = self.windowParameters["channel_max"]
         return channel_max
     
+    def streamLabels(self):
+        # Labels of the stream's channels, "ChN" where the stream has none.
+        labels = self.source.channelLabels()
+        return [labels[k] if labels[k] != "" else "Ch" + str(k+1) for k in range(self.source.channel_count())]
+    
+    def channelLabels(self):
+        # Labels of the channels that can be displayed: the montage's derived
+        # channels, or the stream's.
+        if self.montage is not None:
+            return self.montage.labels
+        return self.streamLabels()
+    
+    def channelCount(self):
+        return len(self.channelLabels())
+    
     def getPlotTicks(self):
         chancounter = 0
         
-        ch = self.inlet.info().desc().child("channels").child("channel")
+        labels = self.channelLabels()
         markers = list()
         chanpos = list()
-        for k in range(self.inlet.info().channel_count()):
+        for k in range(len(labels)):
             if(k>=self.channel_min-1 and k<self.channel_max):
-                if ch.child_value("label") == "":
-                    markers.append("Ch" + str(k+1))
-                else:
-                    markers.append(ch.child_value("label"))
+                markers.append(labels[k])
                 chanpos.append(-self.channel_num+chancounter+1)
                 chancounter = chancounter + 1
-            ch = ch.next_sibling()
     
         ticks = [list(zip(chanpos, markers))]
             
@@ -244,25 +812,34 @@ class Plotter:
     def getWindow(self):
         return self.win
 
+def preloadScipy():
+    # Import scipy while the dialogs are open, off the GUI thread, so creating
+    # the plotter does not wait for it.
+    import scipy.signal
+    import scipy.fft
+
 def Start():
     win = None
-    streams = resolve_stream()
-    
-    sortedStreams, contStreamsNames, discStreamsNames = classifyStreamInlet(streams)
-    dialogContinuous = Dialog(contStreamsNames)
-    dialogMarkers = DialogMarkers(discStreamsNames)
+    p = None
+    # The dialogs open right away and list streams as they are resolved.
+    resolver = StreamResolver()
+    dialogContinuous = Dialog(resolver.names["continuous"])
+    dialogMarkers = DialogMarkers(resolver.names["discrete"])
+    resolver.streamsChanged.connect(lambda: dialogContinuous.setStreams(resolver.names["continuous"]))
+    resolver.streamsChanged.connect(lambda: dialogMarkers.setStreams(resolver.names["discrete"]))
+    threading.Thread(target=preloadScipy, name="PreloadScipy", daemon=True).start()
 
-    if(len(sortedStreams["continuous"]) == 0):
-        dialogContinuous.showError()
-    
-    else:
-        if dialogContinuous.exec_() and dialogContinuous.checkLineEditPattern():
+    if dialogContinuous.exec_() and dialogContinuous.checkLineEditPattern():
+        if(len(resolver.sortedStreams["continuous"]) == 0):
+            dialogContinuous.showError()
+        else:
             windowParameters = dialogContinuous.returnWindowParameters()
             checkedMarkers = []
-            if len(discStreamsNames) > 0:
+            if len(resolver.sortedStreams["discrete"]) > 0:
                 result = dialogMarkers.exec_()
                 if result == 1:
                     checkedMarkers = dialogMarkers.returnWindowParameters()
+            sortedStreams = resolver.snapshot()
             p = Plotter(windowParameters, checkedMarkers, sortedStreams)
             win = p.getWindow()
             try:
@@ -273,8 +850,9 @@ def Start():
             except:
                 pass
             
-        else:
-            print("Plot window was not created.")
+    else:
+        print("Plot window was not created.")
+    resolver.stop()
         
     return win, p
 
@@ -1,5 +1,7 @@
 import pyqtgraph as pg
+from qtpy import QtCore
 import numpy as np
+from instrumentation import NULL_INSTRUMENTATION
 
 class PlotWrapper:
     def __init__(self, plotParams):
@@ -13,12 +15,31 @@ class PlotWrapper:
         self.plt.setYRange(-1.0 * plotParams["chann_num"], 1.0, padding=0)
         self.plt.setLabel('left', "Activation")
         self.plt.setLabel('bottom', "Time (s)")
-        self.markerList = []
         self.tableColorList = ['r', 'g', 'y', 'c', 'm', 'b']
+        self.chann_num = plotParams["chann_num"]
+        # One curve per marker color draws every marker of that color as
+        # disconnected vertical segments; labels come from a pool of TextItems.
+        self.maxLabels = plotParams.get("max_marker_labels", 64)
+        self.markerCurves = []
+        for color in self.tableColorList:
+            curve = pg.PlotCurveItem(pen=pg.mkPen(color), connect='pairs')
+            curve.setZValue(10)
+            self.plt.addItem(curve)
+            self.markerCurves.append(curve)
+        self.markerLabels = []
+        self.instrumentation = plotParams.get("instrumentation", NULL_INSTRUMENTATION)
+        self.overlay = None
 
+        # By default all channels are drawn by a single PlotCurveItem (one per
+        # color group when channel_colors is given) from a reused coordinate
+        # buffer; single_item=False keeps one curve per channel.
+        self.singleItem = plotParams.get("single_item", True)
+        self.channelColors = plotParams.get("channel_colors")
         self.curves = []
-        for ch_ix in range(plotParams["chann_num"]):
-            self.curves += [self.plt.plot()]
+        self.createCurves(plotParams["chann_num"])
+        if self.singleItem:
+            # Ranges are always set explicitly: skip the bounds computations.
+            self.plt.disableAutoRange()
     
         yax = self.plt.getAxis('left')
         yax.setTicks(plotParams["ticks"])
@@ -27,30 +48,118 @@ class PlotWrapper:
     def getWindow(self):
         return self.win
     
-    def updatePlotData(self, timeData, yData, scale):
-        for ch in range(np.shape(yData)[0]):
-            self.curves[ch].setData(timeData, ((yData[ch,:])/scale)-np.shape(yData)[0]+ch+1)
-            
-    def addMarker(self, event, clock_val):
-        eventParam = {}
-        eventParam["ts"] = event[0]
-        label_opts = {'position': 0.98, 'movable': False, 
-                      'anchors': [(0.5, 0.5), (0.5, 0.5)],
-                      'fill': pg.mkBrush('k')}
-        eventParam["marker"] = pg.InfiniteLine(
-            angle=90,movable=False,pos=eventParam["ts"]-clock_val,
-            pen=pg.mkPen(self.tableColorList[event[1]]),
-            label=event[2], labelOpts=label_opts)
-        self.markerList.append(eventParam)
+    def getPlotWidth(self):
+        # Width of the view box in screen pixels.
+        return int(self.plt.getViewBox().width())
+    
+    def createCurves(self, chann_num):
+        for curve in self.curves:
+            self.plt.removeItem(curve)
+        self.curves = []
+        self.coords = None
+        if not self.singleItem:
+            for ch_ix in range(chann_num):
+                self.curves += [self.plt.plot()]
+            return
         
-        self.plt.addItem(self.markerList[-1]["marker"])
+        # Channels are laid out in the coordinate buffer grouped by color, so
+        # each group is a contiguous slice drawn by one item.
+        colors = self.channelColors
+        if colors is None:
+            colors = [(200, 200, 200)]*chann_num
+        groups = []
+        for ch in range(chann_num):
+            color = colors[ch % len(colors)]
+            for group in groups:
+                if group[0] == color:
+                    group[1].append(ch)
+                    break
+            else:
+                groups.append((color, [ch]))
+        self.channelOrder = np.asarray([ch for group in groups for ch in group[1]], dtype=np.intp)
+        self.groupRows = []
+        first = 0
+        for color, channels in groups:
+            curve = pg.PlotCurveItem(pen=pg.mkPen(color), antialias=False)
+            self.plt.addItem(curve)
+            self.curves.append(curve)
+            self.groupRows.append(slice(first, first+len(channels)))
+            first += len(channels)
+        # Offset of each row of the buffer (in channelOrder order).
+        self.offsets = (self.channelOrder - chann_num + 1.0)[:, np.newaxis]
+    
+    def setChannels(self, chann_num, ticks):
+        self.createCurves(chann_num)
+        self.chann_num = chann_num
+        self.plt.setLimits(yMin=-1.0 * (chann_num + 1.0), yMax=1.0)
+        self.plt.setYRange(-1.0 * chann_num, 1.0, padding=0)
+        self.plt.getAxis('left').setTicks(ticks)
+    
+    def updatePlotData(self, timeData, yData, scale):
+        # Painting happens later in the Qt event loop and is not timed here.
+        instr = self.instrumentation
+        t0 = instr.clock()
+        if not self.singleItem:
+            for ch in range(np.shape(yData)[0]):
+                self.curves[ch].setData(timeData, ((yData[ch,:])/scale)-np.shape(yData)[0]+ch+1)
+            instr.record("set_data", t0)
+            return
         
-    def deleteMarker(self, markerNum):
-        self.plt.removeItem(self.markerList[markerNum]["marker"])
-        self.markerList.remove(self.markerList[markerNum])
+        shape = np.shape(yData)
+        if self.coords is None or np.shape(self.coords[1]) != shape:
+            # (Re)allocate the coordinate buffers; the last point of every
+            # channel is not connected to the first point of the next one.
+            connect = np.ones(shape, dtype=np.ubyte)
+            connect[:, -1] = 0
+            # y keeps the precision of the samples (float32 halves the copies).
+            self.coords = (np.empty(shape), np.empty(shape, dtype=np.result_type(yData.dtype, np.float32)), connect)
+        x, y, connect = self.coords
+        x[:] = timeData
+        np.take(yData, self.channelOrder, axis=0, out=y)
+        y *= 1.0/scale
+        y += self.offsets
+        for rows, curve in zip(self.groupRows, self.curves):
+            curve.setData(x[rows].ravel(), y[rows].ravel(), connect=connect[rows].ravel(),
+                          skipFiniteCheck=True)
+        instr.record("set_data", t0)
+    
+    def setOverlayText(self, text):
+        if self.overlay is None:
+            # Parented to the view box so it stays put when the view scrolls.
+            self.overlay = pg.TextItem(color='w', fill=pg.mkBrush(0, 0, 0, 160), anchor=(0, 0))
+            self.overlay.setParentItem(self.plt.getViewBox())
+            self.overlay.setPos(5, 5)
+        self.overlay.setText(text)
+            
+    def setMarkers(self, times, sources, names):
+        # times are relative to now and already culled to the visible range;
+        # sources index the marker streams, whose names are the labels.
+        times = np.asarray(times)
+        sources = np.asarray(sources)
+        ymin = -1.0 * (self.chann_num + 1.0)
+        ymax = 1.0
+        for color, curve in enumerate(self.markerCurves):
+            t = times[sources % 6 == color]
+            if np.size(t) == 0:
+                curve.setData([], [])
+                continue
+            curve.setData(np.repeat(t, 2), np.tile([ymin, ymax], np.size(t)))
         
-    def setNewValMarker(self, markerNum, newVal, plot_duration):
-        self.markerList[markerNum]["marker"].setValue(newVal)
+        # Label only the newest markers.
+        first = max(0, np.size(times) - self.maxLabels)
+        for k in range(first, np.size(times)):
+            label = k - first
+            if label == len(self.markerLabels):
+                item = pg.TextItem(anchor=(0.5, 0.5), fill=pg.mkBrush('k'))
+                item.setZValue(11)
+                self.plt.addItem(item, ignoreBounds=True)
+                self.markerLabels.append(item)
+            item = self.markerLabels[label]
+            item.setText(names[sources[k]], color=self.tableColorList[sources[k] % 6])
+            item.setPos(times[k], 0.5)
+            item.setVisible(True)
+        for item in self.markerLabels[np.size(times)-first:]:
+            item.setVisible(False)
         
     def decr_timerange(self):
         gca = self.plt.getViewBox().viewRange()
@@ -63,4 +172,55 @@ class PlotWrapper:
         newAxisVal = gca[0][0]*1.1
         self.plt.setXRange(newAxisVal, 0.0, padding=0)
         return newAxisVal
-        
\ No newline at end of file
+        
+
+class SpectrumWrapper:
+    def __init__(self, plotParams):
+        # Window next to the time series with the PSD of every channel
+        # (mode "psd") or a rolling spectrogram of their average ("spectrogram").
+        self.win = pg.GraphicsWindow()
+        self.win.setWindowTitle('LSL Spectrum ' + plotParams["name"])
+        self.plt = self.win.addPlot()
+        self.plt.setTitle(plotParams["name"])
+        self.mode = plotParams.get("mode", "psd")
+        self.fmax = plotParams["fmax"]
+        self.coords = None
+        if self.mode == "spectrogram":
+            self.image = pg.ImageItem()
+            self.image.setColorMap(pg.colormap.get("viridis"))
+            self.plt.addItem(self.image)
+            self.plt.setLabel('left', "Frequency (Hz)")
+            self.plt.setLabel('bottom', "Time (s)")
+        else:
+            # All channels in one item, as for the time series.
+            self.curve = pg.PlotCurveItem(pen=pg.mkPen((200, 200, 200)), antialias=False)
+            self.plt.addItem(self.curve)
+            self.plt.setXRange(0, self.fmax, padding=0)
+            self.plt.setLabel('left', "Power (dB)")
+            self.plt.setLabel('bottom', "Frequency (Hz)")
+        self.win.show()
+
+    def getWindow(self):
+        return self.win
+
+    def updateDensity(self, freqs, psd):
+        shape = np.shape(psd)
+        if self.coords is None or np.shape(self.coords[1]) != shape:
+            connect = np.ones(shape, dtype=np.ubyte)
+            connect[:, -1] = 0
+            self.coords = (np.empty(shape), np.empty(shape), connect)
+        x, y, connect = self.coords
+        x[:] = freqs
+        np.log10(np.maximum(psd, 1e-20), out=y)
+        y *= 10
+        self.curve.setData(x.ravel(), y.ravel(), connect=connect.ravel(), skipFiniteCheck=True)
+
+    def updateSpectrogram(self, image, duration, fmax):
+        # image is (columns x freqs) in dB, oldest column first.
+        valid = image[np.isfinite(image)]
+        if np.size(valid) == 0:
+            return
+        levels = (np.min(valid), np.max(valid))
+        # Columns not filled yet are drawn at the lowest level.
+        self.image.setImage(np.nan_to_num(image, nan=levels[0]), autoLevels=False, levels=levels)
+        self.image.setRect(QtCore.QRectF(-duration, 0, duration, fmax))
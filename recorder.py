@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Background recorder of raw samples, filtered samples, timestamps and markers
+to preallocated, memory-mapped .npy segments.
+
+A recording is a directory:
+
+    header.json                 stream info and the number of valid rows per segment
+    data_00000_raw.npy          (segment_samples x all channels)
+    data_00000_filtered.npy     (segment_samples x displayed channels)
+    data_00000_timestamps.npy   (segment_samples,)
+    markers_00000.npy           (segment_markers,) of (timestamp, source)
+
+Segments are preallocated, so a file is larger than its valid data: only the
+rows counted in header.json are valid. The header is replaced atomically after
+the segments are flushed, so after a crash it never counts rows that were not
+written and the recording stays readable with loadRecording().
+"""
+import os
+import json
+import time
+import queue
+import threading
+import numpy as np
+
+# Rows per data segment file.
+DEFAULT_SEGMENT_SAMPLES = 65536
+# Events per marker segment file.
+DEFAULT_SEGMENT_MARKERS = 4096
+# Chunks waiting for the writer thread before new ones are dropped.
+DEFAULT_QUEUE_SIZE = 256
+# Seconds between flushes of the segments and the header.
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+MARKER_DTYPE = np.dtype([("timestamp", np.float64), ("source", np.int32)])
+HEADER_FILE = "header.json"
+
+class Recorder(threading.Thread):
+    def __init__(self, path, srate=0.0, markerNames=(), name="", channelLabels=(), segment_samples=DEFAULT_SEGMENT_SAMPLES,
+                 segment_markers=DEFAULT_SEGMENT_MARKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        # The producers (the acquisition worker) only copy the chunk into a
+        # bounded queue and never wait: when the writer falls behind, chunks
+        # are dropped and counted in the header.
+        super(Recorder, self).__init__(name="LSLRecorder", daemon=True)
+        self.path = path
+        self.segment_samples = int(segment_samples)
+        self.segment_markers = int(segment_markers)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.stopEvent = threading.Event()
+        self.dropped = 0
+        self.segment = None
+        self.markerSegment = None
+        os.makedirs(path, exist_ok=True)
+        self.header = {"format": "lsl_plotter_recording", "version": 1, "name": name,
+                       "srate": float(srate), "channel_labels": list(channelLabels),
+                       "marker_streams": list(markerNames),
+                       "segments": [], "marker_segments": [],
+                       "dropped_chunks": 0, "complete": False}
+        self.writeHeader()
+
+    def put(self, raw, filtered, timestamps, channel_min, channel_max):
+        # raw and filtered are (channels x samples) and may be views on reused
+        # arrays, so they are copied (as samples x channels) before queueing.
+        try:
+            self.queue.put_nowait(("data", np.array(raw.T), np.array(filtered.T),
+                                   np.array(timestamps, dtype=np.float64), channel_min, channel_max))
+        except queue.Full:
+            self.dropped += 1
+
+    def putMarkers(self, timestamps, source):
+        events = np.empty(len(timestamps), dtype=MARKER_DTYPE)
+        events["timestamp"] = timestamps
+        events["source"] = source
+        try:
+            self.queue.put_nowait(("markers", events))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        lastFlush = time.monotonic()
+        while not (self.stopEvent.is_set() and self.queue.empty()):
+            try:
+                item = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                if item[0] == "data":
+                    self.writeData(*item[1:])
+                else:
+                    self.writeMarkers(item[1])
+            if time.monotonic() - lastFlush > self.flush_interval:
+                self.flush()
+                lastFlush = time.monotonic()
+        self.flush(complete=True)
+
+    def stop(self, timeout=5.0):
+        self.stopEvent.set()
+        if self.is_alive():
+            self.join(timeout)
+        if self.dropped > 0:
+            print("Warning. The recorder dropped %d chunks." % self.dropped)
+
+    def openSegment(self, raw, filtered, channel_min, channel_max):
+        self.closeSegment()
+        index = len(self.header["segments"])
+        entry = {"index": index, "rows": 0, "channel_min": channel_min, "channel_max": channel_max}
+        shape = (self.segment_samples,)
+        self.segment = {"entry": entry, "rows": 0,
+                        "raw": self.openFile("data_%05d_raw.npy" % index, raw.dtype, shape + raw.shape[1:]),
+                        "filtered": self.openFile("data_%05d_filtered.npy" % index, filtered.dtype,
+                                                  shape + filtered.shape[1:]),
+                        "timestamps": self.openFile("data_%05d_timestamps.npy" % index, np.float64, shape)}
+        self.header["segments"].append(entry)
+
+    def closeSegment(self):
+        if self.segment is not None:
+            self.flushSegment(self.segment, ("raw", "filtered", "timestamps"))
+            self.segment = None
+
+    def openFile(self, name, dtype, shape):
+        return np.lib.format.open_memmap(os.path.join(self.path, name), mode="w+", dtype=dtype, shape=shape)
+
+    def writeData(self, raw, filtered, timestamps, channel_min, channel_max):
+        n = len(timestamps)
+        pos = 0
+        while pos < n:
+            seg = self.segment
+            # A new segment starts when the current one is full or the
+            # displayed channels (hence the filtered columns) changed.
+            if seg is None or seg["rows"] == self.segment_samples or \
+               (seg["entry"]["channel_min"], seg["entry"]["channel_max"]) != (channel_min, channel_max) or \
+               seg["raw"].shape[1:] != raw.shape[1:] or seg["filtered"].shape[1:] != filtered.shape[1:]:
+                self.openSegment(raw, filtered, channel_min, channel_max)
+                seg = self.segment
+            k = min(n - pos, self.segment_samples - seg["rows"])
+            rows = slice(seg["rows"], seg["rows"] + k)
+            seg["raw"][rows] = raw[pos:pos+k]
+            seg["filtered"][rows] = filtered[pos:pos+k]
+            seg["timestamps"][rows] = timestamps[pos:pos+k]
+            seg["rows"] += k
+            pos += k
+
+    def writeMarkers(self, events):
+        pos = 0
+        while pos < len(events):
+            seg = self.markerSegment
+            if seg is None or seg["rows"] == self.segment_markers:
+                if seg is not None:
+                    self.flushSegment(seg, ("events",))
+                index = len(self.header["marker_segments"])
+                entry = {"index": index, "rows": 0}
+                seg = self.markerSegment = {"entry": entry, "rows": 0,
+                    "events": self.openFile("markers_%05d.npy" % index, MARKER_DTYPE, (self.segment_markers,))}
+                self.header["marker_segments"].append(entry)
+            k = min(len(events) - pos, self.segment_markers - seg["rows"])
+            seg["events"][seg["rows"]:seg["rows"]+k] = events[pos:pos+k]
+            seg["rows"] += k
+            pos += k
+
+    def flushSegment(self, seg, names):
+        # Rows only become valid in the header once they are on disk.
+        for name in names:
+            seg[name].flush()
+        seg["entry"]["rows"] = seg["rows"]
+
+    def flush(self, complete=False):
+        if self.segment is not None:
+            self.flushSegment(self.segment, ("raw", "filtered", "timestamps"))
+        if self.markerSegment is not None:
+            self.flushSegment(self.markerSegment, ("events",))
+        self.header["dropped_chunks"] = self.dropped
+        self.header["complete"] = complete
+        self.writeHeader()
+
+    def writeHeader(self):
+        # Written to a temporary file and renamed, so a crash never leaves a
+        # truncated header behind.
+        path = os.path.join(self.path, HEADER_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.header, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+def loadRecording(path):
+    # Reads a (possibly unfinished) recording. raw, timestamps and markers are
+    # concatenated over the segments; filtered is a list of
+    # (channel_min, channel_max, samples x channels) runs, one per change of
+    # the displayed channels.
+    with open(os.path.join(path, HEADER_FILE)) as f:
+        header = json.load(f)
+    raw = []
+    timestamps = []
+    filtered = []
+    for entry in header["segments"]:
+        if entry["rows"] == 0:
+            continue
+        name = os.path.join(path, "data_%05d_" % entry["index"])
+        rows = slice(0, entry["rows"])
+        raw.append(np.load(name + "raw.npy", mmap_mode="r")[rows])
+        timestamps.append(np.load(name + "timestamps.npy", mmap_mode="r")[rows])
+        part = np.load(name + "filtered.npy", mmap_mode="r")[rows]
+        if filtered and filtered[-1][:2] == (entry["channel_min"], entry["channel_max"]):
+            filtered[-1] = filtered[-1][:2] + (np.concatenate((filtered[-1][2], part)),)
+        else:
+            filtered.append((entry["channel_min"], entry["channel_max"], np.array(part)))
+    markers = [np.load(os.path.join(path, "markers_%05d.npy" % entry["index"]), mmap_mode="r")[:entry["rows"]]
+               for entry in header["marker_segments"] if entry["rows"] > 0]
+    return {"header": header,
+            "raw": np.concatenate(raw) if raw else None,
+            "timestamps": np.concatenate(timestamps) if timestamps else np.empty(0),
+            "filtered": filtered,
+            "markers": np.concatenate(markers) if markers else np.empty(0, dtype=MARKER_DTYPE)}
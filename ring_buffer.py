@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed-size (channels x samples) circular buffer with slice-based reads.
+"""
+import numpy as np
+
+class RingBuffer:
+    def __init__(self, nchannels, size, srate=None, dtype=np.float64):
+        self.buffer = np.zeros((nchannels, int(size)), dtype=dtype)
+        self.size = int(size)
+        self.nchannels = nchannels
+        self.srate = srate
+        # Total number of samples written since creation (never wraps).
+        self.nsamples = 0
+
+    def write(self, y):
+        # Append a (channels x n) chunk with at most two slice copies.
+        n = np.shape(y)[1]
+        if n == 0:
+            return
+        if n > self.size:
+            self.nsamples += n - self.size
+            y = y[:, -self.size:]
+            n = self.size
+        start = self.nsamples % self.size
+        first = min(n, self.size - start)
+        self.buffer[:, start:start+first] = y[:, :first]
+        if first < n:
+            self.buffer[:, :n-first] = y[:, first:]
+        self.nsamples += n
+
+    def views(self, n, rows=slice(None), step=1, last=None):
+        # Return the last n samples as at most two views on the buffer, oldest
+        # first. With step > 1 every step-th sample is taken, keeping the same
+        # phase as np.arange(nsamples-n, nsamples, step) across the wrap point.
+        # Samples never written read as zeros. The views are only valid until
+        # the next write(). last optionally pins the end to an earlier
+        # snapshot of nsamples.
+        if last is None:
+            last = self.nsamples
+        n = min(int(n), self.size)
+        return self.viewsRange(last - n, last, rows, step)
+
+    def viewsRange(self, first, last, rows=slice(None), step=1):
+        # Same as views() for the absolute sample numbers first..last-1, which
+        # must still be held in the buffer.
+        n = min(int(last - first), self.size)
+        if n <= 0:
+            return []
+        start = first % self.size
+        end = start + n
+        if end <= self.size:
+            return [self.buffer[rows, start:end:step]]
+
+        head = self.buffer[rows, start::step]
+        tail_start = (-(self.size - start)) % step
+        tail = self.buffer[rows, tail_start:end-self.size:step]
+        return [head, tail]
+
+    def read(self, n, rows=slice(None), step=1, out=None, last=None):
+        # Copy the last n samples (every step-th) into a contiguous array.
+        # out is reused when it already has the right shape.
+        return self.copyParts(self.views(n, rows, step, last), rows, out)
+
+    def readRange(self, first, last, rows=slice(None), out=None):
+        # Copy the absolute sample numbers first..last-1.
+        return self.copyParts(self.viewsRange(first, last, rows), rows, out)
+
+    def copyParts(self, parts, rows, out):
+        nrows = np.shape(self.buffer[rows, 0])[0]
+        npoints = sum(np.shape(part)[1] for part in parts)
+        if out is None or np.shape(out) != (nrows, npoints):
+            out = np.empty((nrows, npoints), dtype=self.buffer.dtype)
+        pos = 0
+        for part in parts:
+            out[:, pos:pos+np.shape(part)[1]] = part
+            pos += np.shape(part)[1]
+        return out
+
+    def assign(self, y, rows=slice(None)):
+        # Overwrite the last np.shape(y)[1] samples of rows with y (oldest
+        # first), without advancing the write position. Used to backfill rows.
+        pos = 0
+        for part in self.views(np.shape(y)[1], rows):
+            part[:] = y[:, pos:pos+np.shape(part)[1]]
+            pos += np.shape(part)[1]
+
+    def reset(self):
+        self.buffer[:] = 0
+        self.nsamples = 0
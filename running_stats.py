@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Windowed per-channel mean and standard deviation, updated incrementally as
+samples enter and leave the plotted window.
+"""
+import numpy as np
+
+class RunningStats:
+    def __init__(self, nchannels, window):
+        self.nchannels = nchannels
+        self.window = int(window)
+        # Sums are kept around a per-channel shift (the mean at the last
+        # reset) to avoid cancellation on signals with a large offset.
+        self.shift = np.zeros(nchannels)
+        self.sum = np.zeros(nchannels)
+        self.sumsq = np.zeros(nchannels)
+        self.sinceReset = 0
+
+    def reset(self, data):
+        # Recompute the sums exactly from the (channels x window) window.
+        self.shift = np.mean(data, axis=1) if np.shape(data)[1] > 0 else np.zeros(self.nchannels)
+        d = data - self.shift[:, np.newaxis]
+        self.sum = np.sum(d, axis=1)
+        self.sumsq = np.einsum('ij,ij->i', d, d)
+        self.sinceReset = 0
+
+    def update(self, entering, leaving):
+        # entering and leaving are (channels x n) blocks of equal length.
+        e = entering - self.shift[:, np.newaxis]
+        l = leaving - self.shift[:, np.newaxis]
+        self.sum += np.sum(e, axis=1) - np.sum(l, axis=1)
+        self.sumsq += np.einsum('ij,ij->i', e, e) - np.einsum('ij,ij->i', l, l)
+        self.sinceReset += np.shape(entering)[1]
+
+    def needsReset(self):
+        # Resynchronize once per window length to bound rounding drift, which
+        # keeps the amortized cost at O(1) per sample.
+        return self.sinceReset >= self.window
+
+    def mean(self):
+        return self.shift + self.sum/self.window
+
+    def std(self, ddof=1):
+        var = (self.sumsq - self.sum*self.sum/self.window)/max(self.window - ddof, 1)
+        return np.sqrt(np.maximum(var, 0.0))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Session hosting several plotters in one process, driven by a single
+acquisition worker and a single render timer.
+"""
+import threading
+import logging
+from pylsl import local_clock
+from qtpy import QtWidgets
+from acquisition import AcquisitionWorker, DEFAULT_ACQUISITION_RATE
+from frame_scheduler import FrameScheduler
+
+class Session:
+    def __init__(self, acquisition_rate=DEFAULT_ACQUISITION_RATE):
+        self.plotters = []
+        self.refresh_rate = 0
+        self.lock = threading.Lock()
+        self.acquisition_rate = acquisition_rate
+        self.acquisitionWorker = AcquisitionWorker(self, acquisition_rate)
+        # Exceptions raised by the plotters' acquire(), and the last one of
+        # each plotter, logged once per distinct message.
+        self.failures = 0
+        self.lastErrors = {}
+        self.scheduler = FrameScheduler(self.updateData)
+        app = QtWidgets.QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
+    def addPlotter(self, plotter, refresh_rate):
+        # Frames are scheduled at the highest refresh rate requested.
+        with self.lock:
+            self.plotters = self.plotters + [plotter]
+        if refresh_rate > self.refresh_rate:
+            self.refresh_rate = refresh_rate
+            self.scheduler.setRate(self.refresh_rate)
+        self.scheduler.start()
+        if self.acquisitionWorker.stopEvent.is_set():
+            # A thread only starts once: a session that was emptied and
+            # stopped acquires again with a new worker.
+            self.acquisitionWorker = AcquisitionWorker(self, self.acquisition_rate)
+        if not self.acquisitionWorker.is_alive():
+            self.acquisitionWorker.start()
+
+    def removePlotter(self, plotter):
+        with self.lock:
+            self.plotters = [p for p in self.plotters if p is not plotter]
+        self.lastErrors.pop(plotter, None)
+        if len(self.plotters) == 0:
+            self.stop()
+
+    def acquire(self):
+        # Called from the acquisition worker: drain every stream in turn. A
+        # stream that fails is skipped for this tick, so the streams after it
+        # keep acquiring.
+        for plotter in self.plotters:
+            try:
+                plotter.acquire()
+            except Exception as error:
+                self.failures += 1
+                if repr(error) != self.lastErrors.get(plotter):
+                    self.lastErrors[plotter] = repr(error)
+                    logging.exception("Acquisition of a stream failed (keeps running).")
+
+    def updateData(self):
+        # One clock reading per frame, so every stream is drawn on the same
+        # time base. Returns True if any plotter had something to redraw.
+        now = local_clock()
+        drawn = False
+        for plotter in self.plotters:
+            drawn = plotter.updateData(now) or drawn
+        return drawn
+    
+    def frameStats(self):
+        # Achieved frame rate and skipped/idle tick counts.
+        return self.scheduler.stats()
+
+    def stop(self):
+        self.scheduler.stop()
+        self.acquisitionWorker.stop()
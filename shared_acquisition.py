@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Acquisition and filtering in a separate process, published through a
+SharedRingBuffer that any number of viewers (windows or processes) map.
+
+The shared buffer holds one timestamp row, the raw channels and the filtered
+channels of one stream, so viewers attached to the same stream share a single
+inlet and a single filter chain. The first viewer of a stream starts the
+process, which lives as long as that viewer. A server can also be started on
+its own, and then outlives every viewer:
+
+    python shared_acquisition.py --name EEG --filter "1 2 40 45"
+"""
+import os
+import time
+import signal
+import hashlib
+import multiprocessing
+import numpy as np
+from pylsl import resolve_bypred, local_clock
+from acquisition import AcquisitionWorker, DEFAULT_ACQUISITION_RATE
+from shared_ring_buffer import SharedRingBuffer
+
+# Extra seconds of buffer beyond the plotted range, so the oldest samples of
+# a window are not overwritten while a viewer copies it.
+SLACK_SECONDS = 1.0
+# Seconds a viewer waits for a newly started acquisition process.
+START_TIMEOUT = 10.0
+
+def sharedName(uid):
+    return "lslplot_" + hashlib.sha1(uid.encode("utf-8")).hexdigest()[:16]
+
+class AcquisitionServer:
+    def __init__(self, streamInfo, duration, frequency_filter=("0",), filter_type=None,
+                 owner_pid=None, sampling_rate=None):
+        # sampling_rate sizes the buffer of a stream with a nominal rate of 0,
+        # as the viewer's sampling_rate does for its own buffer.
+        from data_source import InletSource
+        from filter_BP import BandPassFilter
+        self.source = InletSource(streamInfo, duration)
+        self.owner_pid = owner_pid
+        nchannels = self.source.channel_count()
+        srate = self.source.nominal_srate() or sampling_rate
+        if not srate:
+            raise ValueError("%s has no nominal rate: a sampling rate is needed to size the shared buffer."
+                             % self.source.name())
+        self.filter = None
+        bandPassFilter = BandPassFilter([int(i) for i in frequency_filter], srate, filter_type == "iir")
+        if bandPassFilter.returnSOS() is not None:
+            from streaming_filter import StreamingFilter
+            self.filter = StreamingFilter(nchannels, sos=bandPassFilter.returnSOS(), zi=bandPassFilter.returnSOSZi())
+        elif np.size(bandPassFilter.returnFilter()) != 0:
+            from streaming_filter import StreamingFilter
+            self.filter = StreamingFilter(nchannels, bandPassFilter.returnFilter())
+        meta = {"uid": streamInfo.uid(), "name": self.source.name(), "srate": self.source.nominal_srate(),
+                "channel_count": nchannels, "channel_labels": self.source.channelLabels(),
+                "frequency_filter": list(frequency_filter), "filter_type": filter_type,
+                "pid": os.getpid(), "tracker_pid": owner_pid}
+        # Rows: timestamps, raw channels, filtered channels.
+        size = int((duration + SLACK_SECONDS)*srate)
+        self.buffer = SharedRingBuffer(sharedName(streamInfo.uid()), 1 + 2*nchannels, max(size, 100),
+                                       srate, meta, create=True)
+        self.chunk = None
+        self.worker = None
+
+    def acquire(self):
+        if self.owner_pid is not None and os.getppid() != self.owner_pid:
+            # The viewer that started this process is gone.
+            self.worker.stopEvent.set()
+            return
+        y, timestamps = self.source.pull()
+        if timestamps is None:
+            return
+        n = len(timestamps)
+        nchannels = np.shape(y)[0]
+        if self.chunk is None or np.shape(self.chunk)[1] < n:
+            self.chunk = np.empty((1 + 2*nchannels, n))
+        chunk = self.chunk[:, :n]
+        chunk[0] = timestamps
+        chunk[1:1+nchannels] = y
+        chunk[1+nchannels:] = y if self.filter is None else self.filter.process(y)
+        self.buffer.write(chunk)
+
+    def run(self, acquisition_rate=DEFAULT_ACQUISITION_RATE):
+        # Acquire on the calling (main) thread until stopped. Daemon processes
+        # are terminated when their owner exits: stop cleanly on SIGTERM so the
+        # shared memory is unlinked.
+        self.worker = AcquisitionWorker(self, acquisition_rate)
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.worker.stopEvent.set())
+        try:
+            self.worker.run()
+        finally:
+            self.buffer.close()
+
+
+def serve(uid, duration, frequency_filter, filter_type, owner_pid=None,
+          acquisition_rate=DEFAULT_ACQUISITION_RATE, sampling_rate=None):
+    # Entry point of the acquisition process.
+    streams = resolve_bypred("uid='%s'" % uid, 1, START_TIMEOUT)
+    if len(streams) == 0:
+        print("Error: stream %s could not be resolved." % uid)
+        return
+    AcquisitionServer(streams[0], duration, frequency_filter, filter_type, owner_pid,
+                      sampling_rate).run(acquisition_rate)
+
+
+class SharedSource:
+    # Data source for Plotter backed by an acquisition process. pull() never
+    # returns data: the plotter reads the shared buffer directly.
+    live = True
+
+    def __init__(self, streamInfo, windowParameters):
+        name = sharedName(streamInfo.uid())
+        self.process = None
+        self.sharedBuffer = self.attach(name)
+        if self.sharedBuffer is None:
+            duration = max(windowParameters["max_time_range"], windowParameters["init_time_range"])
+            context = multiprocessing.get_context("spawn")
+            self.process = context.Process(target=serve, name="LSLAcquisitionProcess", daemon=True,
+                                           args=(streamInfo.uid(), duration,
+                                                 list(windowParameters["frequency_filter"]),
+                                                 windowParameters.get("filter_type"), os.getpid(),
+                                                 windowParameters.get("acquisition_rate", DEFAULT_ACQUISITION_RATE),
+                                                 windowParameters["sampling_rate"]))
+            self.process.start()
+            deadline = time.monotonic() + START_TIMEOUT
+            while self.sharedBuffer is None and time.monotonic() < deadline and self.process.is_alive():
+                time.sleep(0.02)
+                self.sharedBuffer = self.attach(name)
+            if self.sharedBuffer is None:
+                raise RuntimeError("The acquisition process for %s did not start." % streamInfo.name())
+        meta = self.sharedBuffer.meta
+        if meta["frequency_filter"] != list(windowParameters["frequency_filter"]) or \
+           meta["filter_type"] != windowParameters.get("filter_type"):
+            print("Warning. Attached to an acquisition process filtering with %s." % " ".join(meta["frequency_filter"]))
+        self.nchannels = meta["channel_count"]
+
+    def attach(self, name):
+        try:
+            return SharedRingBuffer(name)
+        except (FileNotFoundError, RuntimeError):
+            return None
+
+    def name(self):
+        return self.sharedBuffer.meta["name"]
+
+    def nominal_srate(self):
+        return self.sharedBuffer.meta["srate"]
+
+    def channel_count(self):
+        return self.nchannels
+
+    def channelLabels(self):
+        return self.sharedBuffer.meta["channel_labels"]
+
+    def sampleDtype(self):
+        # The shared buffer is float64, which its timestamp row needs.
+        return self.sharedBuffer.buffer.dtype
+
+    def markerSources(self):
+        return []
+
+    def clock(self):
+        return local_clock()
+
+    def pull(self):
+        return None, None
+
+    def filteredRows(self, channel_min, channel_max):
+        # Buffer rows of the filtered channels channel_min..channel_max (1-based).
+        return slice(self.nchannels + channel_min, self.nchannels + channel_max + 1)
+
+    def timestampAt(self, sample):
+        return float(self.sharedBuffer.buffer[0, sample % self.sharedBuffer.size])
+
+    def close(self):
+        # The acquisition process stops by itself once its owner exits.
+        self.sharedBuffer.close()
+
+
+def main(argv=None):
+    import argparse
+    from pylsl import resolve_byprop
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", required=True, help="name of the LSL stream")
+    parser.add_argument("--filter", default="0", help="frequency filter as in the dialog")
+    parser.add_argument("--iir", action="store_true", help="use the IIR band-pass filter")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds kept in the shared buffer")
+    parser.add_argument("--srate", type=float, default=None,
+                        help="samples per second buffered for a stream with a nominal rate of 0")
+    args = parser.parse_args(argv)
+    streams = resolve_byprop("name", args.name, 1, START_TIMEOUT)
+    if len(streams) == 0:
+        print("Error: stream %s could not be resolved." % args.name)
+        return 1
+    try:
+        server = AcquisitionServer(streams[0], args.duration, args.filter.split(), "iir" if args.iir else None,
+                                   sampling_rate=args.srate)
+    except ValueError as error:
+        print("Error: %s" % error)
+        return 1
+    print("Serving %s as %s. Press Ctrl+C to stop." % (args.name, server.buffer.shm.name))
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
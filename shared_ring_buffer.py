@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+RingBuffer kept in a multiprocessing.shared_memory block, so one process can
+write it and others map the same memory and read windows without copies
+through a pipe.
+
+The block starts with a small header (shape, the sample counter and a JSON
+metadata area) followed by the (channels x size) float64 buffer. There is a
+single writer. It stores the samples before advancing the counter, so a
+reader that snapshots nsamples first only sees complete samples. Windows
+shorter than the buffer by a margin are never overwritten while they are
+copied.
+"""
+import os
+import json
+import numpy as np
+from multiprocessing import shared_memory
+from ring_buffer import RingBuffer
+
+MAGIC = 0x4C534C5242       # "LSLRB"
+HEADER_WORDS = 16          # int64 fields: magic, nchannels, size, nsamples, meta length
+FLOAT_WORDS = 8            # float64 fields: srate
+META_BYTES = 65536         # JSON metadata (stream name, labels, ...)
+DATA_OFFSET = 8*(HEADER_WORDS + FLOAT_WORDS) + META_BYTES
+
+def attachMemory(name):
+    # Returns the block and whether the resource tracker registered it.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False), False
+    except TypeError:
+        return shared_memory.SharedMemory(name=name), True
+
+class SharedRingBuffer(RingBuffer):
+    def __init__(self, name, nchannels=None, size=None, srate=None, meta=None, create=False):
+        # create=True allocates the block (the writer); otherwise an existing
+        # block is attached and its shape read from the header.
+        if create:
+            size = int(size)
+            self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=DATA_OFFSET + 8*nchannels*size)
+        else:
+            self.shm, tracked = attachMemory(name)
+        self.owner = create
+        self.header = np.ndarray((HEADER_WORDS,), dtype=np.int64, buffer=self.shm.buf)
+        self.floats = np.ndarray((FLOAT_WORDS,), dtype=np.float64, buffer=self.shm.buf, offset=8*HEADER_WORDS)
+        if create:
+            metaBytes = json.dumps(meta or {}).encode("utf-8")
+            if len(metaBytes) > META_BYTES:
+                raise ValueError("Shared buffer metadata is too large.")
+            self.shm.buf[8*(HEADER_WORDS + FLOAT_WORDS):8*(HEADER_WORDS + FLOAT_WORDS)+len(metaBytes)] = metaBytes
+            self.header[1:5] = [nchannels, size, 0, len(metaBytes)]
+            self.floats[0] = srate or 0.0
+            # Written last: readers wait for it before trusting the header.
+            self.header[0] = MAGIC
+        elif self.header[0] != MAGIC:
+            self.shm.close()
+            raise RuntimeError("Shared buffer %s is not initialized yet." % name)
+        start = 8*(HEADER_WORDS + FLOAT_WORDS)
+        self.meta = json.loads(bytes(self.shm.buf[start:start+int(self.header[4])]).decode("utf-8"))
+        if not create and tracked and self.meta.get("tracker_pid") != os.getpid():
+            # Only the creating process may unlink the block. Processes it was
+            # spawned from share its resource tracker and must leave it be.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.nchannels = int(self.header[1])
+        self.size = int(self.header[2])
+        self.srate = float(self.floats[0])
+        self.buffer = np.ndarray((self.nchannels, self.size), dtype=np.float64,
+                                 buffer=self.shm.buf, offset=DATA_OFFSET)
+
+    @property
+    def nsamples(self):
+        return int(self.header[3])
+
+    @nsamples.setter
+    def nsamples(self, value):
+        self.header[3] = value
+
+    def close(self):
+        # Drop the arrays before closing the mapping they point into.
+        self.buffer = self.header = self.floats = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental Welch estimate of the power spectral density of every displayed
+channel, and a rolling spectrogram of their average, computed from the ring
+buffer the plotter already fills.
+
+Only the segments completed since the previous update are transformed: they
+are windowed and passed to a single rfft over all channels and segments, and
+their periodograms are folded into an exponential moving average.
+"""
+import functools
+import numpy as np
+
+# Seconds of the exponential average of the periodograms.
+DEFAULT_AVERAGE_TIME = 2.0
+# Fraction of a segment shared with the next one.
+DEFAULT_OVERLAP = 0.5
+# Segments transformed per update at most; older ones are skipped when the
+# estimator falls behind.
+MAX_SEGMENTS = 64
+# Columns of the rolling spectrogram.
+DEFAULT_HISTORY = 200
+
+@functools.lru_cache(maxsize=16)
+def taper(name, n):
+    # Window function and its power sum, shared by all estimators. The arrays
+    # are read-only, as they are shared.
+    if name == "hann":
+        w = 0.5 - 0.5*np.cos(2*np.pi*np.arange(n)/n)
+    elif name == "hamming":
+        w = 0.54 - 0.46*np.cos(2*np.pi*np.arange(n)/n)
+    elif name == "boxcar":
+        w = np.ones(n)
+    else:
+        raise ValueError("Unknown window %s." % name)
+    w.flags.writeable = False
+    return w, float(np.sum(w**2))
+
+def defaultSegmentLength(srate):
+    # A power of two of about one second, for a resolution of about 1 Hz.
+    return int(2**np.ceil(np.log2(max(srate, 16))))
+
+def hopLength(nfft, overlap):
+    # Samples between the starts of consecutive segments.
+    return max(1, int(round(nfft*(1 - overlap))))
+
+class SpectralEstimator:
+    def __init__(self, nchannels, srate, nfft=None, overlap=DEFAULT_OVERLAP,
+                 average_time=DEFAULT_AVERAGE_TIME, window="hann", history=DEFAULT_HISTORY, max_nfft=None):
+        # max_nfft is the size of the buffer segments are read from: a segment
+        # and a hop must fit in it, or no segment would ever complete.
+        self.nchannels = nchannels
+        self.srate = srate
+        self.nfft = int(nfft or defaultSegmentLength(srate))
+        if max_nfft is not None and self.nfft + hopLength(self.nfft, overlap) > max_nfft:
+            clamped = int(2**np.floor(np.log2(max(self.nfft, 2))))
+            while clamped > 2 and clamped + hopLength(clamped, overlap) > max_nfft:
+                clamped //= 2
+            print("Warning. Spectrum segments of %d samples do not fit the %d-sample buffer: using %d."
+                  % (self.nfft, max_nfft, clamped))
+            self.nfft = clamped
+        self.hop = hopLength(self.nfft, overlap)
+        self.window, power = taper(window, self.nfft)
+        # One-sided density: every bin but DC (and Nyquist) counts twice.
+        self.freqs = np.fft.rfftfreq(self.nfft, 1.0/srate)
+        self.scaling = np.full(len(self.freqs), 2.0/(srate*power))
+        self.scaling[0] /= 2
+        if self.nfft % 2 == 0:
+            self.scaling[-1] /= 2
+        # Weight of a new periodogram in the moving average.
+        self.alpha = 1 - np.exp(-self.hop/(srate*average_time)) if average_time > 0 else 1.0
+        self.psd = None
+        self.history = np.full((history, len(self.freqs)), np.nan)
+        self.historyCount = 0
+        # Absolute sample number at which the next segment ends.
+        self.next = None
+        # Incremented whenever psd changes, for dirty tracking.
+        self.version = 0
+
+    def update(self, buffer, rows=slice(None), last=None):
+        # Transform the segments of buffer completed up to sample last (a
+        # snapshot of buffer.nsamples). buffer may be written concurrently: only
+        # samples before last are read. Returns True if psd changed.
+        if last is None:
+            last = buffer.nsamples
+        if self.next is None:
+            self.next = max(self.nfft, last - last % self.hop)
+        oldest = last - buffer.size + self.hop + self.nfft
+        if self.next < oldest:
+            # Fell more than a buffer behind: resume with what is still held.
+            self.next += -(-(oldest - self.next)//self.hop)*self.hop
+        count = (last - self.next)//self.hop + 1
+        if count <= 0:
+            return False
+        if count > MAX_SEGMENTS:
+            self.next += (count - MAX_SEGMENTS)*self.hop
+            count = MAX_SEGMENTS
+        end = self.next + (count - 1)*self.hop
+        span = buffer.readRange(self.next - self.nfft, end, rows)
+        self.next = end + self.hop
+        self.process(span, count)
+        return True
+
+    def process(self, span, count):
+        # span holds count segments of nfft samples, hop samples apart.
+        segments = np.lib.stride_tricks.sliding_window_view(span, self.nfft, axis=1)[:, ::self.hop]
+        segments = segments[:, :count]
+        # Constant detrend, then the window, in one pass over a new array.
+        x = segments - np.mean(segments, axis=2, keepdims=True)
+        x *= self.window
+        spec = np.fft.rfft(x, axis=2)
+        power = spec.real**2
+        power += spec.imag**2
+        power *= self.scaling
+        # Fold the count periodograms (oldest first) into the average at once.
+        a = self.alpha
+        decay = (1 - a)**count
+        weights = a*(1 - a)**np.arange(count - 1, -1, -1)
+        psd = np.tensordot(power, weights, axes=([1], [0]))
+        if self.psd is None:
+            # The first update starts from the mean of its segments.
+            psd = np.mean(power, axis=1)
+        else:
+            psd += decay*self.psd
+        self.psd = psd
+        self.addHistory(np.mean(power, axis=0))
+        self.version += 1
+
+    def addHistory(self, power):
+        # power is (segments x freqs), averaged over channels; stored in dB.
+        n = min(len(power), len(self.history))
+        db = 10*np.log10(np.maximum(power[-n:], 1e-20))
+        idx = np.arange(self.historyCount, self.historyCount + n) % len(self.history)
+        self.history[idx] = db
+        self.historyCount += n
+
+    def spectrogram(self):
+        # History of the channel-averaged power in dB, oldest column first.
+        # Columns not filled yet are NaN.
+        return np.roll(self.history, -(self.historyCount % len(self.history)), axis=0)
+
+    def density(self, fmax=None):
+        # Frequencies and the averaged PSD of every channel (channels x freqs)
+        # up to fmax, or None before the first segment.
+        if self.psd is None:
+            return None
+        n = len(self.freqs) if fmax is None else int(np.searchsorted(self.freqs, fmax, side="right"))
+        return self.freqs[:n], self.psd[:, :n]
+
+    def reset(self):
+        self.psd = None
+        self.next = None
+        self.history[:] = np.nan
+        self.historyCount = 0
+        self.version += 1
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Background discovery of LSL streams, so the dialogs can open at once and list
+streams as they appear.
+"""
+from pylsl import ContinuousResolver
+from qtpy import QtCore
+
+MARKER_STREAM_TYPES = ("Markers", "Events", "Marker")
+
+def isMarkerStream(info):
+    # Classified from the resolved StreamInfo; no inlet is opened.
+    return info.type() in MARKER_STREAM_TYPES
+
+class StreamResolver(QtCore.QObject):
+    # Emitted from the GUI thread when new streams were found.
+    streamsChanged = QtCore.Signal()
+
+    def __init__(self, interval=0.2, forget_after=5.0):
+        super(StreamResolver, self).__init__()
+        # liblsl resolves in its own thread; the timer only collects results.
+        self.resolver = ContinuousResolver(forget_after=forget_after)
+        # Lists only grow, so indices chosen in a dialog stay valid.
+        self.sortedStreams = {"continuous": [], "discrete": []}
+        self.names = {"continuous": [], "discrete": []}
+        self.uids = set()
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(int(1000*interval))
+
+    def poll(self):
+        changed = False
+        for info in self.resolver.results():
+            if info.uid() in self.uids:
+                continue
+            self.uids.add(info.uid())
+            kind = "discrete" if isMarkerStream(info) else "continuous"
+            self.sortedStreams[kind].append(info)
+            self.names[kind].append(info.name())
+            changed = True
+        if changed:
+            self.streamsChanged.emit()
+
+    def snapshot(self):
+        # Copy of the streams found so far: the "continuous" and "discrete"
+        # StreamInfos, the layout Plotter takes as sortedStreams.
+        return {"continuous": list(self.sortedStreams["continuous"]),
+                "discrete": list(self.sortedStreams["discrete"])}
+
+    def stop(self):
+        self.timer.stop()
+        self.resolver = None
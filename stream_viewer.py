@@ -19,10 +19,14 @@ class Dialog(QtWidgets.QDialog, Ui_MainWindow):
         super(Dialog, self).__init__()
         Ui_MainWindow.__init__(self)
         self.setupUi(self)
-        for name in listStreams:
-            self.comboBox_lslStream.addItem(name)
+        self.setStreams(listStreams)
             
         self.setValuePatterns()
+    
+    def setStreams(self, listStreams):
+        # Streams are only ever appended, so the selection is kept.
+        for name in listStreams[self.comboBox_lslStream.count():]:
+            self.comboBox_lslStream.addItem(name)
             
     def returnWindowParameters(self):
         windowParameters={}
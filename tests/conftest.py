@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures. The modules of the plotter live at the top of the
+repository, next to this directory; Qt runs offscreen unless a platform is
+set. Where pylsl cannot load liblsl, a stand-in pylsl module takes its place:
+the tests feed the plotter from stub inlets and recordings, and only need
+the channel formats and the clock of pylsl.
+"""
+import os
+import sys
+import time
+import types
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+def standInPylsl(reason):
+    # Channel formats as liblsl numbers them, a monotonic clock, and stream
+    # functions that fail like pylsl does without liblsl.
+    module = types.ModuleType("pylsl")
+    module.__doc__ = "Stand-in for pylsl, which is not usable here: %s" % reason
+    for value, name in enumerate(("cf_undefined", "cf_float32", "cf_double64", "cf_string",
+                                  "cf_int32", "cf_int16", "cf_int8", "cf_int64")):
+        setattr(module, name, value)
+    module.local_clock = time.monotonic
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("liblsl is not available: %s" % reason)
+    for name in ("StreamInfo", "StreamInlet", "StreamOutlet", "ContinuousResolver",
+                 "resolve_streams", "resolve_byprop", "resolve_bypred"):
+        setattr(module, name, unavailable)
+    return module
+
+# pylsl raises RuntimeError, not ImportError, when liblsl is missing.
+try:
+    import pylsl
+except (ImportError, RuntimeError) as error:
+    sys.modules["pylsl"] = standInPylsl(str(error).splitlines()[0])
+
+@pytest.fixture
+def lsl():
+    # pylsl, or its stand-in.
+    return sys.modules["pylsl"]
+
+@pytest.fixture
+def qapp():
+    QtWidgets = pytest.importorskip("qtpy.QtWidgets")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
@@ -0,0 +1,88 @@
+import time
+import numpy as np
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self):
+        self.calls += 1
+
+class Flaky:
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self):
+        self.calls += 1
+        if self.calls % 3 == 0:
+            raise RuntimeError("bad chunk")
+
+class StubInfo:
+    def __init__(self, nchannels, channel_format):
+        self.nchannels = nchannels
+        self.format = channel_format
+
+    def channel_count(self):
+        return self.nchannels
+
+    def channel_format(self):
+        return self.format
+
+class StubInlet:
+    # Hands out queued (samples x channels) chunks the way pylsl does.
+    def __init__(self, chunks, channel_format):
+        self.chunks = list(chunks)
+        self.stubInfo = StubInfo(np.shape(chunks[0][0])[1], channel_format)
+
+    def info(self):
+        return self.stubInfo
+
+    def pull_chunk(self, timeout=0.0, max_samples=1024, dest_obj=None):
+        if not self.chunks:
+            return [], []
+        samples, timestamps = self.chunks.pop(0)
+        if dest_obj is not None:
+            dest_obj[:len(timestamps)] = samples
+            return None, list(timestamps)
+        return samples.tolist(), list(timestamps)
+
+def test_worker_acquires_until_stopped(lsl):
+    from acquisition import AcquisitionWorker
+    target = Counter()
+    worker = AcquisitionWorker(target, acquisition_rate=500)
+    worker.start()
+    time.sleep(0.1)
+    worker.stop()
+    assert not worker.is_alive() and target.calls > 3
+    calls = target.calls
+    time.sleep(0.02)
+    assert target.calls == calls
+
+def test_worker_survives_exceptions(lsl):
+    from acquisition import AcquisitionWorker
+    target = Flaky()
+    worker = AcquisitionWorker(target, acquisition_rate=500)
+    worker.start()
+    time.sleep(0.1)
+    assert worker.is_alive()
+    worker.stop()
+    assert target.calls > 3 and worker.failures == target.calls//3
+    assert worker.lastError == repr(RuntimeError("bad chunk"))
+
+def test_chunks_are_pulled_into_the_preallocated_array(lsl):
+    from acquisition import ChunkReader
+    samples = np.arange(12.0).reshape(4, 3)
+    samples[1, 2] = np.nan
+    reader = ChunkReader(StubInlet([(samples, [1.0, 2.0, 3.0, 4.0])], lsl.cf_double64), max_samples=8)
+    y, t = reader.pull()
+    assert y.shape == (3, 4) and np.shares_memory(y, reader.samples)
+    expected = samples.T.copy()
+    expected[2, 1] = 0.0
+    assert np.array_equal(y, expected) and t.tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert reader.pull() == (None, None)
+
+def test_string_streams_use_the_list_path(lsl):
+    from acquisition import ChunkReader
+    reader = ChunkReader(StubInlet([(np.array([["1", "2"]]), [5.0])], lsl.cf_string))
+    y, t = reader.pull()
+    assert not reader.direct and y.tolist() == [[1.0], [2.0]] and t.tolist() == [5.0]
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pytest
+from recorder import Recorder
+
+SRATE = 100.0
+
+@pytest.fixture
+def recording(tmp_path):
+    # 10 s of 3 channels at 100 Hz with two marker streams.
+    path = os.path.join(str(tmp_path), "recording")
+    rec = Recorder(path, srate=SRATE, markerNames=["a", "b"], name="rec", channelLabels=["Cz", "Pz", ""],
+                   segment_samples=128)
+    rec.start()
+    raw = np.arange(3000, dtype=np.float64).reshape(3, 1000)
+    timestamps = 50 + np.arange(1000)/SRATE
+    for k in range(0, 1000, 37):
+        rec.put(raw[:, k:k+37], raw[:, k:k+37], timestamps[k:k+37], 1, 3)
+    rec.putMarkers([51.0, 53.0], 0)
+    rec.putMarkers([52.0], 1)
+    rec.stop()
+    return path, raw, timestamps
+
+def test_replay_at_maximum_speed(lsl, recording):
+    from data_source import ReplaySource
+    path, raw, timestamps = recording
+    source = ReplaySource(path, None, max_samples=300)
+    assert source.name() == "rec" and source.channel_count() == 3
+    assert source.channelLabels() == ["Cz", "Pz", ""]
+    chunks = []
+    while True:
+        y, t = source.pull()
+        if t is None:
+            break
+        assert len(t) <= 300
+        chunks.append((y.copy(), t.copy()))
+    assert np.array_equal(np.concatenate([c[0] for c in chunks], axis=1), raw)
+    assert np.array_equal(np.concatenate([c[1] for c in chunks]), timestamps)
+    markers = source.markerSources()
+    assert [m.name() for m in markers] == ["a", "b"]
+    assert markers[0].pull_chunk()[1] == [51.0, 53.0] and markers[1].pull_chunk()[1] == [52.0]
+
+def test_seek_with_preroll(lsl, recording):
+    from data_source import ReplaySource
+    path, raw, timestamps = recording
+    source = ReplaySource(path, None)
+    source.seek(55.0, preroll=1.0)
+    y, t = source.pull()
+    assert t[0] == pytest.approx(54.0) and np.array_equal(y, raw[:, 400:])
+    assert source.markerSources()[0].pull_chunk()[1] == []
+
+def test_realtime_replay_follows_its_clock(lsl, recording):
+    from data_source import ReplaySource
+    path, raw, timestamps = recording
+    source = ReplaySource(path, 1.0)
+    source.seek(55.0)
+    y, t = source.pull()
+    assert t is not None and t[-1] <= source.clock() and t[-1] < 56.0
@@ -0,0 +1,30 @@
+import numpy as np
+from decimation import minMaxDecimate
+
+def test_envelope_keeps_every_sample():
+    rng = np.random.default_rng(0)
+    y = rng.standard_normal((3, 1003))
+    t = np.arange(1003)/100.0
+    envelopeTime, envelope = minMaxDecimate(t, y, 10)
+    assert envelope.shape == (3, 20) and envelopeTime.shape == (20,)
+    # The column extremes are the extremes of the whole window.
+    assert np.array_equal(np.amin(envelope, axis=1), np.amin(y, axis=1))
+    assert np.array_equal(np.amax(envelope, axis=1), np.amax(y, axis=1))
+    bounds = (np.arange(11)*1003)//10
+    for c in range(10):
+        column = y[:, bounds[c]:bounds[c+1]]
+        assert np.array_equal(envelope[:, 2*c], np.amin(column, axis=1))
+        assert np.array_equal(envelope[:, 2*c+1], np.amax(column, axis=1))
+    assert envelopeTime[0] == t[0] and envelopeTime[-1] == t[-1]
+
+def test_short_windows_are_untouched():
+    y = np.arange(12.0).reshape(2, 6)
+    t = np.arange(6.0)
+    assert minMaxDecimate(t, y, 3)[1] is y
+    assert minMaxDecimate(t, y, 0)[1] is y
+
+def test_spikes_survive():
+    y = np.zeros((1, 10000), dtype=np.float32)
+    y[0, 4321] = 7
+    envelopeTime, envelope = minMaxDecimate(np.arange(10000.0), y, 100)
+    assert envelope.dtype == np.float32 and envelope.max() == 7
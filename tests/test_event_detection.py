@@ -0,0 +1,42 @@
+import time
+import numpy as np
+from event_detection import EventDetector, KINDS, hysteresis
+
+def test_hysteresis_holds_between_levels():
+    on = np.array([[0, 1, 1, 0, 0, 1], [0, 0, 0, 0, 1, 0]], dtype=bool)
+    off = np.array([[1, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 0]], dtype=bool)
+    states, onsets = hysteresis(on, off, np.array([True, False]))
+    assert states.astype(int).tolist() == [[0, 1, 1, 0, 0, 1], [0, 0, 0, 0, 1, 1]]
+    assert np.flatnonzero(onsets[0]).tolist() == [1, 5] and np.flatnonzero(onsets[1]).tolist() == [4]
+
+def test_every_check_fires_once_per_episode():
+    srate = 2000.0
+    nch = 256
+    n = int(10*srate)
+    t = np.arange(n)/srate
+    data = np.random.default_rng(0).standard_normal((nch, n))
+    data[3, 5000:5003] = 20                      # spike: threshold and peak-to-peak
+    data[7, 8000:] = 0                           # disconnected
+    data[9] += 2*np.sin(2*np.pi*50*t)            # line noise
+    detector = EventDetector(nch, srate, threshold=8, peak_to_peak=15, flat=0.01, line_noise=0.5)
+    events = []
+    elapsed = 0.0
+    for k in range(0, n, 20):
+        t0 = time.perf_counter()
+        events += detector.process(data[:, k:k+20], t[k:k+20])
+        elapsed += time.perf_counter() - t0
+    found = {(KINDS[kind], tuple(channels.tolist())) for kind, when, channels in events}
+    assert found == {("threshold", (3,)), ("peak_to_peak", (3,)), ("flat", (7,)), ("line_noise", (9,))}
+    assert len(events) == 4
+    assert [when for kind, when, channels in events if kind == 0] == [t[5000]]
+    assert [when for kind, when, channels in events if kind == 2] == [t[8000]]
+    # 256 channels at 2 kHz stay well within the default budget per chunk.
+    assert elapsed/(n//20) < detector.budget
+
+def test_reset_rearms_the_checks():
+    detector = EventDetector(2, 100.0, threshold=1)
+    y = np.array([[0.0, 2.0, 2.0], [0.0, 0.0, 0.0]])
+    assert len(detector.process(y, np.arange(3.0))) == 1
+    assert detector.process(y[:, 1:], np.arange(2.0)) == []
+    detector.reset()
+    assert len(detector.process(y[:, 1:], np.arange(2.0))) == 1
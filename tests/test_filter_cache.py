@@ -0,0 +1,37 @@
+import os
+import numpy as np
+import filter_cache
+from filter_cache import FilterCache
+
+def test_memory_and_disk_hits(tmp_path):
+    calls = []
+    def design():
+        calls.append(1)
+        return np.arange(5.0)
+    cache = FilterCache(str(tmp_path))
+    key = ("fir", (1, 2, 40, 45), 250.0)
+    assert np.array_equal(cache.get(key, design), np.arange(5.0))
+    assert np.array_equal(cache.get(key, design), np.arange(5.0))
+    # A new process only has the files on disk.
+    assert np.array_equal(FilterCache(str(tmp_path)).get(key, design), np.arange(5.0))
+    assert len(calls) == 1
+
+def test_design_version_invalidates_the_disk(tmp_path, monkeypatch):
+    cache = FilterCache(str(tmp_path))
+    key = ("fir", (1, 2), 100.0)
+    cache.get(key, lambda: np.zeros(3))
+    monkeypatch.setattr(filter_cache, "DESIGN_VERSION", filter_cache.DESIGN_VERSION + 1)
+    assert np.array_equal(FilterCache(str(tmp_path)).get(key, lambda: np.ones(3)), np.ones(3))
+
+def test_memory_only_and_eviction(tmp_path):
+    cache = FilterCache(None, max_entries=2)
+    for k in range(3):
+        cache.get(("k", k), lambda: np.full(2, k))
+    assert len(cache.memory) == 2 and ("k", 0) not in cache.memory
+    small = FilterCache(str(tmp_path), max_bytes=3000)
+    for k in range(10):
+        small.get(("big", k), lambda: np.zeros(100))
+    sizes = [os.path.getsize(os.path.join(str(tmp_path), name)) for name in os.listdir(str(tmp_path))]
+    assert sum(sizes) <= 3000 and len(sizes) > 0
+    small.clear()
+    assert os.listdir(str(tmp_path)) == [] and len(small.memory) == 0
@@ -0,0 +1,25 @@
+import time
+from frame_scheduler import FrameScheduler
+
+def test_ticks_draw_and_idle(qapp):
+    drawn = iter([True, False, True])
+    scheduler = FrameScheduler(lambda: next(drawn), refresh_rate=50)
+    for k in range(3):
+        scheduler.tick()
+    stats = scheduler.stats()
+    assert stats["frames"] == 2 and stats["idle"] == 1
+    scheduler.stop()
+
+def test_missed_ticks_are_dropped_and_slow_frames_stretch_the_interval(qapp):
+    def slow():
+        time.sleep(0.05)
+        return True
+    scheduler = FrameScheduler(slow, refresh_rate=100)
+    scheduler.tick()
+    scheduler.lastTick -= 0.1
+    scheduler.tick()
+    scheduler.stop()
+    # About ten periods of 10 ms passed since the previous tick.
+    assert scheduler.skipped >= 9
+    # 50 ms frames may only take MAX_RENDER_LOAD of the GUI thread.
+    assert scheduler.interval > scheduler.period
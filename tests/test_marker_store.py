@@ -0,0 +1,32 @@
+import numpy as np
+from marker_store import MarkerStore
+
+def test_events_stay_sorted_across_sources():
+    store = MarkerStore(capacity=4)
+    store.add([1.0, 3.0, 5.0], 0)
+    store.add([2.0, 4.0], 1)
+    times, sources = store.window(0.0, 10.0)
+    assert times.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert sources.tolist() == [0, 1, 0, 1, 0]
+
+def test_window_and_eviction():
+    store = MarkerStore(capacity=4)
+    for k in range(100):
+        store.add([float(k)], k % 3)
+        store.evictBefore(k - 10.0)
+    assert len(store) == 11
+    # Evicted entries are compacted, so the capacity stays bounded.
+    assert np.size(store.ts) <= 64
+    times, sources = store.window(95.0, 97.0)
+    assert times.tolist() == [95.0, 96.0, 97.0] and sources.tolist() == [2, 0, 1]
+
+def test_version_tracks_changes():
+    store = MarkerStore()
+    version = store.version
+    store.add([], 0)
+    assert store.version == version
+    store.add([1.0], 0)
+    store.evictBefore(0.0)
+    assert store.version == version + 1
+    store.evictBefore(2.0)
+    assert store.version == version + 2 and len(store) == 0
@@ -0,0 +1,55 @@
+import numpy as np
+from ring_buffer import RingBuffer
+from minmax_pyramid import MinMaxPyramid
+
+SIZE = 5000
+
+def filled(rng):
+    data = rng.standard_normal((3, 40000))
+    base = RingBuffer(3, SIZE)
+    pyramid = MinMaxPyramid(3, SIZE, min_size=16)
+    pos = 0
+    for n in rng.integers(1, 300, 400):
+        base.write(data[:, pos:pos+n])
+        pos += min(n, 40000 - pos)
+        pyramid.update(base)
+    return data, base, pyramid, pos
+
+def test_levels_hold_block_extremes():
+    data, base, pyramid, pos = filled(np.random.default_rng(0))
+    assert [level[0] for level in pyramid.levels] == [4, 16, 64, 256]
+    for k, (blockSize, mins, maxs) in enumerate(pyramid.levels):
+        end = pos//blockSize
+        blocks = data[:, :end*blockSize].reshape(3, end, blockSize)
+        n = min(mins.size, end)
+        out = pyramid.read(k, n, end)
+        assert np.array_equal(out[:, 0::2], np.amin(blocks, axis=2)[:, end-n:])
+        assert np.array_equal(out[:, 1::2], np.amax(blocks, axis=2)[:, end-n:])
+
+def test_rebuild_matches_incremental_updates():
+    data, base, pyramid, pos = filled(np.random.default_rng(1))
+    rebuilt = MinMaxPyramid(3, SIZE, min_size=16)
+    rebuilt.rebuild(base)
+    for (b, mins, maxs), (b2, mins2, maxs2) in zip(pyramid.levels, rebuilt.levels):
+        # Blocks entirely within the samples the base buffer still holds.
+        n = mins.nsamples + (SIZE - pos)//b
+        assert mins2.nsamples == mins.nsamples
+        assert np.array_equal(mins2.read(n), mins.read(n)) and np.array_equal(maxs2.read(n), maxs.read(n))
+
+def test_select():
+    data, base, pyramid, pos = filled(np.random.default_rng(2))
+    assert pyramid.select(SIZE, 20) == 2 and pyramid.select(SIZE, 1000) is None
+
+def test_update_on_a_wrapped_buffer():
+    # A pyramid created on a buffer that already wrapped, or updated after
+    # falling more than a buffer behind, summarizes what the buffer holds.
+    data, base, pyramid, pos = filled(np.random.default_rng(3))
+    late = MinMaxPyramid(3, SIZE, min_size=16)
+    late.update(base)
+    assert late.blocks(0) == pos//4
+    assert np.array_equal(late.read(0, 100, pos//4), pyramid.read(0, 100, pos//4))
+    base.write(data[:, :3*SIZE])
+    late.update(base)
+    assert late.blocks(0) == base.nsamples//4
+    assert np.array_equal(late.read(0, 10, base.nsamples//4)[:, 1::2],
+                          np.amax(base.read(40).reshape(3, 10, 4), axis=2))
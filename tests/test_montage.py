@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from montage import Montage, bipolar, montageFor, projection
+
+LABELS = ["Fp1", "Fp2", "F7", "F3", "Fz", "F4", "F8", "T3", "C3", "Cz", "C4", "T4",
+          "T5", "P3", "Pz", "P4", "T6", "O1", "O2", "A1", "A2"]
+INDEX = {label: k for k, label in enumerate(LABELS)}
+
+@pytest.fixture
+def x():
+    return np.random.default_rng(0).standard_normal((len(LABELS), 500))
+
+def test_average_and_linked_mastoids(x):
+    assert np.allclose(montageFor("average", LABELS).apply(x), x - x.mean(axis=0))
+    m = montageFor("linked_mastoids", LABELS)
+    assert m.labels == LABELS[:-2]
+    assert np.allclose(m.apply(x), x[:-2] - (x[INDEX["A1"]] + x[INDEX["A2"]])/2)
+
+def test_double_banana_understands_old_names(x):
+    m = montageFor("double_banana", LABELS)
+    assert m.channel_count() == 18 and m.labels[1] == "F7-T7"
+    assert np.allclose(m.apply(x)[1], x[INDEX["F7"]] - x[INDEX["T3"]])
+
+def test_laplacian_is_cached_and_selects_rows(x):
+    m = montageFor("laplacian", LABELS)
+    c3 = m.labels.index("C3")
+    neighbours = [INDEX["F3"], INDEX["T3"], INDEX["Cz"], INDEX["P3"]]
+    assert np.allclose(m.apply(x)[c3], x[INDEX["C3"]] - x[neighbours].mean(axis=0))
+    assert montageFor("laplacian", LABELS) is m
+    assert np.allclose(m.apply(x, slice(2, 5)), m.apply(x)[2:5])
+    assert np.allclose(m.apply(x.astype(np.float32), dtype=np.float32), m.apply(x), atol=1e-5)
+
+def test_wide_sparse_bipolar():
+    pytest.importorskip("scipy.sparse")
+    wide = bipolar(["Ch%d" % k for k in range(128)], [("Ch%d" % k, "Ch%d" % (k+1)) for k in range(127)])
+    big = np.random.default_rng(1).standard_normal((128, 100))
+    assert not isinstance(wide.select(slice(None)), np.ndarray)
+    assert np.allclose(wide.apply(big), big[:-1] - big[1:])
+
+def test_projection_removes_components(x):
+    rng = np.random.default_rng(2)
+    A = rng.standard_normal((len(LABELS), len(LABELS)))
+    W = np.linalg.inv(A)
+    sources = W @ x
+    sources[[0, 3]] = 0
+    assert np.allclose(projection(LABELS, A, W, [0, 3]).apply(x), A @ sources)
+
+def test_errors():
+    with pytest.raises(ValueError):
+        montageFor("linked_mastoids", LABELS[:5])
+    with pytest.raises(ValueError):
+        montageFor("unknown", LABELS)
+    with pytest.raises(ValueError):
+        Montage("empty", np.zeros((0, 3)), [])
+    with pytest.raises(ValueError):
+        montageFor(Montage("narrow", np.ones((1, len(LABELS) - 1)), ["Sum"]), LABELS)
+    assert montageFor(None, LABELS) is None
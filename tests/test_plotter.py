@@ -0,0 +1,128 @@
+import os
+import numpy as np
+import pytest
+from montage import Montage
+from recorder import Recorder
+
+SRATE = 100.0
+LABELS = ["Fp1", "Fp2", "Cz", "Pz", "A1", "A2"]
+
+class IdleSession:
+    # Stands in for the worker thread and render timer, so the test drives
+    # acquire() and updateData() itself.
+    def addPlotter(self, plotter, refresh_rate):
+        pass
+
+    def removePlotter(self, plotter):
+        pass
+
+    def frameStats(self):
+        return {}
+
+@pytest.fixture
+def recording(tmp_path):
+    path = os.path.join(str(tmp_path), "recording")
+    rec = Recorder(path, srate=SRATE, markerNames=["mk"], name="rec", channelLabels=LABELS)
+    rec.start()
+    raw = np.random.default_rng(0).standard_normal((len(LABELS), 1000))
+    rec.put(raw, raw, 10 + np.arange(1000)/SRATE, 1, len(LABELS))
+    rec.putMarkers([18.5, 19.5], 0)
+    rec.stop()
+    return path, raw
+
+def plotter(path, **parameters):
+    from data_source import ReplaySource
+    from plotter import Plotter
+    windowParameters = {"stream_num": 0, "max_time_range": 2, "init_time_range": 2, "init_data_scale": 1,
+                        "channel_min": 1, "channel_max": 4, "sampling_rate": SRATE, "refresh_rate": 20,
+                        "frequency_filter": ["0"], "common_average": False, "standardize": False,
+                        "zero_mean": False, "plot_library": 1, "minmax_decimation": False}
+    windowParameters.update(parameters)
+    return Plotter(windowParameters, [0], None, session=IdleSession(), source=ReplaySource(path, None))
+
+def test_acquire_buffers_and_render_snapshots(lsl, qapp, recording):
+    path, raw = recording
+    p = plotter(path)
+    p.acquire()
+    # Acquisition only buffers; nothing is drawn until the render tick.
+    assert p.str_buffer.nsamples == 1000 and p.frameKey is None
+    assert p.updateData()
+    assert np.allclose(p.yData, raw[:4, -200:])
+    assert p.timeData[-1] == pytest.approx(0.0)
+    assert len(p.markerStore) == 2
+    # Nothing new: the frame is not redrawn.
+    assert not p.updateData()
+    p.stop()
+
+def test_channel_change_backfills_from_the_raw_buffer(lsl, qapp, recording):
+    path, raw = recording
+    p = plotter(path)
+    p.acquire()
+    p.setChannelRange(3, 6)
+    assert p.updateData()
+    assert np.allclose(p.yData, raw[2:6, -200:])
+    assert p.displayedLabels == LABELS[2:6]
+    p.stop()
+
+def test_float32_storage(lsl, qapp, recording):
+    path, raw = recording
+    p = plotter(path, sample_dtype="float32")
+    p.acquire()
+    assert p.str_buffer.buffer.dtype == np.float32 and p.rawBuffer.buffer.dtype == np.float64
+    assert p.updateData()
+    assert np.allclose(p.yData, raw[:4, -200:], atol=1e-6)
+    p.stop()
+
+def test_montage_switch(lsl, qapp, recording):
+    path, raw = recording
+    p = plotter(path, montage="linked_mastoids")
+    p.acquire()
+    p.updateData()
+    assert np.allclose(p.yData, raw[:4, -200:] - raw[4:6, -200:].mean(axis=0))
+    p.setMontage("average")
+    p.updateData()
+    assert np.allclose(p.yData, raw[:4, -200:] - raw[:, -200:].mean(axis=0))
+    p.stop()
+
+def test_montage_switch_without_raw_buffer_starts_empty(lsl, qapp, recording):
+    path, raw = recording
+    p = plotter(path, montage="linked_mastoids", raw_buffer=False)
+    p.acquire()
+    p.setMontage("average")
+    assert not p.str_buffer.buffer.any()
+    p.stop()
+
+def test_montage_of_another_width_is_rejected(lsl, qapp, recording):
+    path, raw = recording
+    p = plotter(path, raw_buffer=False)
+    with pytest.raises(ValueError):
+        p.setMontage(Montage("narrow", np.ones((1, len(LABELS) - 1)), ["Sum"]))
+    assert p.montage is None
+    p.stop()
+    with pytest.raises(ValueError):
+        plotter(path, montage=Montage("wide", np.ones((1, len(LABELS) + 1)), ["Sum"]))
+
+def test_detections_are_stored_as_markers(lsl, qapp, recording):
+    path, raw = recording
+    shown = np.abs(raw[:4])
+    p = plotter(path, detection={"threshold": shown.max() - 1e-9})
+    p.acquire()
+    assert p.eventNames == ["mk", "threshold", "peak_to_peak", "flat", "line_noise"]
+    times, sources = p.markerStore.window(0.0, 100.0)
+    peak = np.unravel_index(np.argmax(shown), shown.shape)[1]
+    assert times[sources == 1].tolist() == [pytest.approx(10 + peak/SRATE)]
+    p.stop()
+
+def test_instrumentation_export(lsl, qapp, recording, tmp_path):
+    path, raw = recording
+    p = plotter(path)
+    with pytest.raises(ValueError):
+        p.exportInstrumentation(os.path.join(str(tmp_path), "stages.json"))
+    p.stop()
+    p = plotter(path, instrumentation=True)
+    p.acquire()
+    p.updateData()
+    p.exportInstrumentation(os.path.join(str(tmp_path), "stages.csv"))
+    with open(os.path.join(str(tmp_path), "stages.csv")) as f:
+        assert f.readline().startswith("name,unit,count")
+    p.stop()
@@ -0,0 +1,21 @@
+import os
+import numpy as np
+from recorder import Recorder, loadRecording
+
+def test_recording_round_trip(tmp_path):
+    path = os.path.join(str(tmp_path), "recording")
+    rec = Recorder(path, srate=100.0, markerNames=["mk"], segment_samples=50, segment_markers=4)
+    rec.start()
+    raw = np.arange(8*37, dtype=np.float32).reshape(8, 37)
+    for k in range(5):
+        rec.put(raw + k, raw[2:5] * 2.0 + k, np.arange(37) + 37*k, 3, 5)
+        rec.putMarkers([k, k + 0.5], k % 2)
+    rec.put(raw, raw[0:2], np.arange(37) + 185, 1, 2)
+    rec.stop()
+    data = loadRecording(path)
+    assert data["header"]["complete"]
+    assert np.array_equal(data["timestamps"], np.arange(222))
+    assert np.array_equal(data["raw"][:37], raw.T) and np.array_equal(data["raw"][37:74], raw.T + 1)
+    assert [run[:2] for run in data["filtered"]] == [(3, 5), (1, 2)]
+    assert np.array_equal(data["filtered"][0][2][37:74], raw[2:5].T*2.0 + 1)
+    assert np.array_equal(data["markers"]["timestamp"], np.repeat(np.arange(5.0), 2) + np.tile([0, 0.5], 5))
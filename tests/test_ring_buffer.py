@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from ring_buffer import RingBuffer
+
+def reference(rb, data, n, step):
+    # The index-array gather the plotter used to do.
+    idx = np.remainder(np.arange(rb.nsamples-n, rb.nsamples, step), rb.size)
+    return data[:, idx]
+
+@pytest.mark.parametrize("size", [7, 10, 64])
+@pytest.mark.parametrize("chunk", [1, 3, 7, 11, 100])
+def test_wraparound_reads(size, chunk):
+    rng = np.random.default_rng(size*1000 + chunk)
+    rb = RingBuffer(3, size)
+    mirror = np.zeros((3, size))
+    for k in range(12):
+        y = rng.standard_normal((3, chunk))
+        idx = np.remainder(np.arange(rb.nsamples, rb.nsamples+chunk), size)
+        mirror[:, idx] = y
+        rb.write(y)
+        assert np.array_equal(rb.buffer, mirror)
+        for n in (1, size//2, size):
+            for step in (1, 2, 3):
+                assert np.array_equal(rb.read(n, step=step), reference(rb, mirror, n, step))
+                assert np.array_equal(rb.read(n, slice(1, 3), step), reference(rb, mirror, n, step)[1:3])
+                assert len(rb.views(n, step=step)) <= 2
+
+def test_assign_backfills_rows_across_the_wrap():
+    rb = RingBuffer(3, 10)
+    rb.write(np.zeros((3, 17)))
+    y = np.arange(16.0).reshape(2, 8)
+    rb.assign(y, slice(1, 3))
+    assert rb.nsamples == 17
+    assert np.array_equal(rb.read(8, slice(1, 3)), y) and not rb.read(10, slice(0, 1)).any()
+
+def test_read_range_and_last():
+    rb = RingBuffer(2, 10)
+    data = np.arange(50.0).reshape(2, 25)
+    rb.write(data)
+    assert rb.nsamples == 25
+    assert np.array_equal(rb.readRange(17, 23), data[:, 17:23])
+    assert np.array_equal(rb.readRange(15, 25, slice(1, 2)), data[1:, 15:25])
+    assert np.array_equal(rb.read(4, last=20), data[:, 16:20])
+
+def test_reset():
+    rb = RingBuffer(2, 5)
+    rb.write(np.ones((2, 7)))
+    rb.reset()
+    assert rb.nsamples == 0 and not rb.buffer.any()
@@ -0,0 +1,19 @@
+import numpy as np
+from ring_buffer import RingBuffer
+from running_stats import RunningStats
+
+def test_matches_batch_statistics_of_the_window():
+    rng = np.random.default_rng(0)
+    rb = RingBuffer(4, 1000)
+    stats = RunningStats(4, 300)
+    stats.reset(rb.read(300))
+    for k in range(200):
+        y = 1e4 + rng.standard_normal((4, int(rng.integers(1, 120))))
+        n = np.shape(y)[1]
+        stats.update(y, rb.readRange(rb.nsamples - 300, rb.nsamples - 300 + n))
+        rb.write(y)
+        if stats.needsReset():
+            stats.reset(rb.read(300))
+        window = rb.read(300)
+        assert np.allclose(stats.mean(), np.mean(window, axis=1), rtol=0, atol=1e-8)
+        assert np.allclose(stats.std(), np.std(window, axis=1, ddof=1), rtol=1e-6)
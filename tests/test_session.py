@@ -0,0 +1,40 @@
+import time
+
+class Stream:
+    # Stands in for a plotter; acquire() raises error when one is given.
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+
+    def acquire(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+
+    def updateData(self, now):
+        return False
+
+def test_a_failing_stream_does_not_starve_the_others(lsl, qapp):
+    from session import Session
+    session = Session(acquisition_rate=500)
+    bad = Stream(RuntimeError("bad stream"))
+    good = Stream()
+    session.addPlotter(bad, 20)
+    session.addPlotter(good, 20)
+    time.sleep(0.1)
+    session.stop()
+    assert good.calls > 3 and good.calls >= bad.calls - 1
+    assert session.failures == bad.calls and session.acquisitionWorker.failures == 0
+    assert session.lastErrors[bad] == repr(RuntimeError("bad stream"))
+
+def test_an_emptied_session_acquires_again(lsl, qapp):
+    from session import Session
+    session = Session(acquisition_rate=500)
+    first = Stream()
+    session.addPlotter(first, 20)
+    session.removePlotter(first)
+    second = Stream()
+    session.addPlotter(second, 20)
+    time.sleep(0.1)
+    assert session.acquisitionWorker.is_alive() and second.calls > 3
+    session.stop()
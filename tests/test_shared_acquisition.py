@@ -0,0 +1,36 @@
+import os
+import pytest
+
+class StubInfo:
+    def uid(self):
+        return "stub-%d" % os.getpid()
+
+class IrregularSource:
+    # Stands in for the inlet of a stream with a nominal rate of 0.
+    def __init__(self, streamInfo, max_buflen):
+        pass
+
+    def name(self):
+        return "irregular"
+
+    def nominal_srate(self):
+        return 0.0
+
+    def channel_count(self):
+        return 2
+
+    def channelLabels(self):
+        return ["a", "b"]
+
+def test_irregular_streams_are_buffered_at_the_viewer_rate(lsl, monkeypatch):
+    import data_source
+    from shared_acquisition import AcquisitionServer, SLACK_SECONDS
+    monkeypatch.setattr(data_source, "InletSource", IrregularSource)
+    server = AcquisitionServer(StubInfo(), 4.0, sampling_rate=250.0)
+    try:
+        assert server.buffer.srate == 250.0 and server.buffer.size == int((4.0 + SLACK_SECONDS)*250)
+        assert server.buffer.meta["srate"] == 0.0
+    finally:
+        server.buffer.close()
+    with pytest.raises(ValueError):
+        AcquisitionServer(StubInfo(), 4.0)
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import pytest
+from shared_ring_buffer import SharedRingBuffer
+from minmax_pyramid import MinMaxPyramid
+
+@pytest.fixture
+def shared():
+    writer = SharedRingBuffer("lslrb_test_%d" % os.getpid(), 3, 10, 100.0,
+                              {"name": "test", "tracker_pid": os.getpid()}, create=True)
+    reader = SharedRingBuffer(writer.shm.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+def test_reader_sees_the_writer(shared):
+    writer, reader = shared
+    assert reader.meta["name"] == "test" and reader.size == 10 and reader.srate == 100.0
+    writer.write(np.arange(21, dtype=float).reshape(3, 7))
+    writer.write(np.arange(21, dtype=float).reshape(3, 7) + 100)
+    assert reader.nsamples == 14
+    assert np.array_equal(reader.read(4, slice(1, 2)), [[110, 111, 112, 113]])
+    assert np.array_equal(reader.read(4, slice(0, 1), last=10), [[6, 100, 101, 102]])
+
+def test_pyramid_attached_after_the_buffer_wrapped():
+    # A viewer attaching to a running acquisition process finds a buffer
+    # that wrapped long ago; its pyramid must summarize what is held.
+    size = 20000
+    writer = SharedRingBuffer("lslrb_wrap_%d" % os.getpid(), 5, size, 1000.0, {"name": "wrap"}, create=True)
+    reader = SharedRingBuffer(writer.shm.name)
+    try:
+        data = np.random.default_rng(0).standard_normal((5, 3*size + 123))
+        for chunk in np.array_split(data, 40, axis=1):
+            writer.write(chunk)
+        rows = slice(1, 5)
+        pyramid = MinMaxPyramid(4, size, min_size=16)
+        pyramid.rebuild(reader, rows)
+        fresh = MinMaxPyramid(4, size, min_size=16)
+        fresh.update(reader, rows)
+        end = reader.nsamples//4
+        expected = np.amax(data[1:5, (end-50)*4:end*4].reshape(4, 50, 4), axis=2)
+        for p in (pyramid, fresh):
+            assert p.blocks(0) == end
+            assert np.array_equal(p.read(0, 50, end)[:, 1::2], expected)
+    finally:
+        reader.close()
+        writer.close()
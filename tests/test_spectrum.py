@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from ring_buffer import RingBuffer
+from spectrum import SpectralEstimator
+
+SRATE = 1000.0
+NCH = 128
+
+@pytest.fixture
+def data():
+    t = np.arange(20000)/SRATE
+    x = np.random.default_rng(0).standard_normal((NCH, len(t)))*0.1
+    x[:8] += np.sin(2*np.pi*50*t)
+    return x
+
+def test_incremental_estimate_finds_the_line(data):
+    rb = RingBuffer(NCH, 5000, SRATE)
+    est = SpectralEstimator(NCH, SRATE, average_time=0)
+    for k in range(0, np.shape(data)[1], 20):
+        rb.write(data[:, k:k+20])
+        est.update(rb)
+    freqs, psd = est.density()
+    assert abs(freqs[np.argmax(psd[0])] - 50) < 1 and abs(freqs[np.argmax(psd[20])] - 50) > 1
+    # With no averaging the estimate is the periodogram of the last segment.
+    signal = pytest.importorskip("scipy.signal")
+    _, ref = signal.periodogram(data[:, est.next-est.hop-est.nfft:est.next-est.hop], SRATE,
+                                window="hann", detrend="constant")
+    assert np.allclose(est.psd, ref)
+
+def test_batched_and_single_segment_updates_agree(data):
+    a = SpectralEstimator(NCH, SRATE)
+    b = SpectralEstimator(NCH, SRATE)
+    rb = RingBuffer(NCH, 20000, SRATE)
+    rb.write(data)
+    a.next = b.next = a.nfft
+    a.update(rb, last=a.nfft)
+    b.update(rb, last=b.nfft)
+    a.update(rb, last=10000)
+    a.update(rb)
+    for last in range(b.nfft + b.hop, 20001, b.hop):
+        b.update(rb, last=last)
+    assert a.next == b.next and a.historyCount == b.historyCount
+    assert np.allclose(a.psd[:, 1:], b.psd[:, 1:], rtol=1e-3)
+
+def test_segments_are_fitted_to_the_buffer(data):
+    # Segments longer than the buffer are shortened, so an estimate appears.
+    assert SpectralEstimator(NCH, SRATE, 8192, max_nfft=5000).nfft == 2048
+    small = SpectralEstimator(NCH, 500.0, max_nfft=500)
+    rb = RingBuffer(NCH, 500, 500.0)
+    rb.write(data[:, :2000])
+    assert small.nfft == 256 and small.update(rb) and small.psd is not None
+
+def test_reset_clears_the_estimate(data):
+    rb = RingBuffer(NCH, 5000, SRATE)
+    rb.write(data[:, :5000])
+    est = SpectralEstimator(NCH, SRATE)
+    assert est.update(rb)
+    version = est.version
+    est.reset()
+    assert est.density() is None and est.version > version
+    assert np.all(np.isnan(est.spectrogram()))
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+signal = pytest.importorskip("scipy.signal")
+from streaming_filter import StreamingFilter
+
+NCHANNELS = 64
+
+def chunked(x, rng):
+    sizes = rng.integers(1, 700, 100)
+    splits = np.cumsum(sizes)[np.cumsum(sizes) < np.shape(x)[1]]
+    return np.split(x, splits, axis=1)
+
+@pytest.mark.parametrize("ntaps", [15, 63, 255, 1023])
+def test_fir_matches_one_lfilter_pass(ntaps):
+    rng = np.random.default_rng(ntaps)
+    B = rng.standard_normal(ntaps)/ntaps
+    x = rng.standard_normal((NCHANNELS, 20000))
+    reference = signal.lfilter(B, 1.0, x, axis=-1, zi=np.tile(signal.lfilter_zi(B, 1.0), (NCHANNELS, 1)))[0]
+    chunks = chunked(x, rng)
+    for mode in ("auto", "direct", "fft"):
+        f = StreamingFilter(NCHANNELS, B, mode=mode)
+        y = np.concatenate([f.process(c) for c in chunks], axis=1)
+        assert np.allclose(y, reference, atol=1e-9), mode
+    # float32 against the float64 path, in both FIR forms.
+    scale = np.max(np.abs(reference))
+    for mode in ("direct", "fft"):
+        f = StreamingFilter(NCHANNELS, B, mode=mode, dtype=np.float32)
+        y = np.concatenate([f.process(c.astype(np.float32)) for c in chunks], axis=1)
+        assert y.dtype == np.float32 and np.max(np.abs(y - reference)) < 1e-5*scale, mode
+
+def test_iir_matches_one_sosfilt_pass():
+    rng = np.random.default_rng(0)
+    sos = signal.butter(4, [1, 40], btype="bandpass", fs=1000.0, output="sos")
+    x = rng.standard_normal((NCHANNELS, 20000))
+    zi = np.tile(signal.sosfilt_zi(sos)[:, np.newaxis, :], (1, NCHANNELS, 1))
+    reference = signal.sosfilt(sos, x, axis=-1, zi=zi)[0]
+    f = StreamingFilter(NCHANNELS, sos=sos)
+    y = np.concatenate([f.process(c) for c in chunked(x, rng)], axis=1)
+    assert np.allclose(y, reference)
+
+def test_float32_iir_and_integer_input():
+    # IIR band-pass (float64 sections, float32 output) against float64, and
+    # integer input against its float64 conversion.
+    rng = np.random.default_rng(0)
+    sos = signal.butter(4, [1, 40], btype="bandpass", fs=1000.0, output="sos")
+    x = (1000*rng.standard_normal((NCHANNELS, 20000))).astype(np.int16)
+    reference = StreamingFilter(NCHANNELS, sos=sos).process(x.astype(np.float64))
+    y = StreamingFilter(NCHANNELS, sos=sos, dtype=np.float32).process(x)
+    assert y.dtype == np.float32 and np.max(np.abs(y - reference)) < 1e-5*np.max(np.abs(reference))
+    B = rng.standard_normal(63)/63
+    reference = StreamingFilter(NCHANNELS, B).process(x)
+    y = StreamingFilter(NCHANNELS, B, dtype=np.float32).process(x)
+    assert np.max(np.abs(y - reference)) < 1e-5*np.max(np.abs(reference))
+
+def test_resized_filter_restarts_and_copies_state():
+    rng = np.random.default_rng(1)
+    B = rng.standard_normal(31)/31
+    x = rng.standard_normal((4, 500))
+    f = StreamingFilter(4, B)
+    f.process(x[:, :200])
+    other = f.resized(2)
+    other.copyState(slice(0, 2), f, slice(2, 4))
+    assert np.allclose(other.process(x[2:, 200:]), f.process(x[:, 200:])[2:])
+    sos = signal.butter(2, [1, 40], btype="bandpass", fs=1000.0, output="sos")
+    f = StreamingFilter(4, sos=sos)
+    f.process(x[:, :200])
+    other = f.resized(2)
+    other.copyState(slice(0, 2), f, slice(2, 4))
+    assert np.allclose(other.process(x[2:, 200:]), f.process(x[:, 200:])[2:])
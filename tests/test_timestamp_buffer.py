@@ -0,0 +1,26 @@
+import numpy as np
+from ring_buffer import RingBuffer
+from timestamp_buffer import Dejitterer, searchTimestamps
+
+def test_search_over_the_wrapped_timestamps():
+    rng = np.random.default_rng(0)
+    rb = RingBuffer(1, 100)
+    times = np.cumsum(rng.exponential(0.01, 350))
+    for chunk in np.array_split(times, 17):
+        rb.write(chunk[np.newaxis, :])
+    for t in (times[0], times[249], times[250], times[300] + 1e-9, times[-1], times[-1] + 1):
+        assert searchTimestamps(rb, t, rb.nsamples) == max(250, int(np.searchsorted(times, t)))
+    assert searchTimestamps(rb, times[320], 300) == 300
+
+def test_dejittering_recovers_the_clock():
+    rng = np.random.default_rng(0)
+    period = 1/500.0
+    clean = 1000 + np.arange(5000)*period
+    jitter = rng.standard_normal(5000)*period/3
+    dejitterer = Dejitterer()
+    out = np.concatenate([dejitterer.process(chunk) for chunk in np.array_split(clean + jitter, 250)])
+    assert np.std(out[-1000:] - clean[-1000:]) < np.std(jitter[-1000:])/5
+    assert abs(dejitterer.period - period) < 1e-6
+    # A gap restarts the fit instead of bending it.
+    gapped = dejitterer.process(clean[-1] + 10 + np.arange(20)*period)
+    assert abs(gapped[0] - (clean[-1] + 10)) < 1e-9
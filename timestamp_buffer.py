@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Per-sample timestamps for streams whose samples are not evenly spaced
+(nominal rate 0, or jittery devices such as eye trackers and IMUs).
+
+The timestamps are kept in a RingBuffer written in step with the data buffer,
+so sample k of both belongs together. The visible window is located by binary
+search on them, and optional online dejittering replaces the timestamps of
+each chunk by a linear fit over the most recent samples.
+"""
+import numpy as np
+from ring_buffer import RingBuffer
+
+# Samples the dejittering fit spans.
+DEFAULT_DEJITTER_WINDOW = 1000
+# A timestamp further than this (seconds) from the fit starts a new fit, e.g.
+# after the stream was interrupted.
+GAP_SECONDS = 0.5
+
+def searchTimestamps(buffer, t, last, rows=slice(None)):
+    # Absolute number of the first sample before last whose timestamp (row
+    # rows of buffer) is at or after t; last if there is none. Timestamps
+    # increase with the sample number, so each of the (at most two) views of
+    # the ring is sorted and searched in O(log n).
+    n = min(last, buffer.size)
+    first = last - n
+    for part in buffer.views(n, rows, last=last):
+        k = int(np.searchsorted(part[0], t, side="left"))
+        if k < np.shape(part)[1]:
+            return first + k
+        first += np.shape(part)[1]
+    return last
+
+class Dejitterer:
+    def __init__(self, window=DEFAULT_DEJITTER_WINDOW, gap=GAP_SECONDS):
+        # Raw timestamps of the last window samples.
+        self.history = RingBuffer(1, window)
+        self.gap = gap
+        # Fit of the last chunk: timestamp of its newest sample and period.
+        self.newest = None
+        self.period = None
+
+    def process(self, timestamps):
+        # Return the dejittered timestamps of a chunk: least-squares line of
+        # timestamp against sample number over the last window samples,
+        # evaluated at the samples of the chunk.
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        k = len(timestamps)
+        if self.newest is not None and abs(timestamps[0] - (self.newest + self.period)) > self.gap:
+            self.reset()
+        self.history.write(timestamps[np.newaxis, :])
+        m = min(self.history.nsamples, self.history.size)
+        if m < 2:
+            return timestamps
+        # Sample numbers relative to the newest sample, centered for precision.
+        t = self.history.read(m)[0]
+        i = np.arange(1 - m, 1, dtype=np.float64)
+        di = i - np.mean(i)
+        tm = np.mean(t)
+        self.period = np.dot(di, t - tm)/np.dot(di, di)
+        self.newest = tm - self.period*np.mean(i)
+        return self.newest + self.period*np.arange(1 - k, 1)
+
+    def reset(self):
+        self.history.reset()
+        self.newest = None
+        self.period = None